@@ -0,0 +1,87 @@
+# Measures how long importing the add-on takes, which delays the start of Anki.
+# Each run imports the add-on in a new Python process, after aqt was imported, because aqt
+# is already imported when Anki loads the add-on.
+# Results are written as JSON, which can be compared with the results of another run
+# using benchmarks/compare.py. The script exits with status 1 if the median import time
+# is over the budget.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_import --output import.json
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .common import REPO_PATH, BenchmarkResults
+
+DEFAULT_RUNS = 10
+
+# The import should only register hooks. It took about 20 ms when the budget was set,
+# importing the config window and BeautifulSoup at startup adds about 200 ms.
+IMPORT_BUDGET_MS = 75
+
+IMPORT_ADDON_CODE = (
+    "import json, sys, time\n"
+    "import aqt\n"
+    "start = time.perf_counter()\n"
+    "import src.anking_notetypes\n"
+    "secs = time.perf_counter() - start\n"
+    "print(json.dumps({'secs': secs, 'modules': sorted(sys.modules)}))\n"
+)
+
+
+def import_addon() -> Dict[str, Any]:
+    """Imports the add-on in a new process and returns the time the import took
+    and the names of the modules that were imported."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_ADDON_CODE],
+        cwd=REPO_PATH,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(runs: int) -> BenchmarkResults:
+    results = BenchmarkResults("import", runs)
+    times: List[float] = []
+    modules: List[str] = []
+    for _ in range(runs):
+        result = import_addon()
+        times.append(result["secs"])
+        modules = result["modules"]
+    results.add(["import_addon"], times)
+    median_ms = statistics.median(times) * 1000
+    results.details["addon_modules"] = [
+        module for module in modules if module.startswith("src.anking_notetypes")
+    ]
+    results.details["budget_ms"] = IMPORT_BUDGET_MS
+    results.details["over_budget"] = median_ms > IMPORT_BUDGET_MS
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--output", type=Path, help="defaults to stdout")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    results.write(args.output)
+
+    median_ms = results.to_dict()["results"]["import_addon"]["median_secs"] * 1000
+    print(
+        f"Import took {median_ms:.1f} ms (median), the budget is {IMPORT_BUDGET_MS} ms",
+        file=sys.stderr,
+    )
+    if results.details["over_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+# pylint: disable=protected-access
+# Measures the memory used by sessions of the note types window, without Anki running.
+# The window is opened on a synthetic collection (see synthetic_collection.py) with an offscreen
+# Qt platform, the outdated note types are updated, some settings are edited and the changes
+# are saved, which closes the window. This is repeated for several cycles.
+# Tracing makes the regexes of the settings much slower, a cycle takes about a minute.
+#
+# The allocations are traced with tracemalloc and attributed to the subsystem of the add-on
+# they were made in (the innermost add-on module in their traceback). For each phase of a
+# cycle the peak and the memory held at its end are reported, for each cycle the memory
+# retained after the window was closed. tracemalloc only sees allocations of Python objects,
+# so the memory of the Qt widgets and of Anki's backend isn't included, but the Python objects
+# the widgets keep alive (e.g. note type dicts in closures) are.
+#
+# The script exits with status 1 if the memory retained after closing the window grows by
+# more than MAX_RETAINED_GROWTH_BYTES per cycle, which means that something keeps the objects
+# of closed windows alive.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_memory --output memory.json
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import Future
+from contextlib import ExitStack
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+from aqt.qt import QApplication, QCoreApplication, QEventLoop, QTimer
+
+from src.anking_notetypes import utils
+from src.anking_notetypes.ankiaddonconfig import manager, window
+from src.anking_notetypes.gui import config_window, extra_notetype_versions
+
+from .bench_scaling import OpenCollection
+from .common import BenchmarkResults
+from .synthetic_collection import SyntheticCollectionSpec, create_synthetic_collection
+
+DEFAULT_CYCLES = 3
+DEFAULT_WARMUP_CYCLES = 1
+DEFAULT_NOTES = 1000
+# tracing makes the regexes of the settings much slower, so only a few note types are
+# added to the collection by default, the tabs of the others only have an import button
+DEFAULT_NOTETYPES = ["AnKingOverhaul", "Basic-AnKing", "IO-one by one"]
+
+# number of frames stored per allocation, enough to reach the add-on code from Qt callbacks
+TRACEBACK_FRAMES = 25
+
+# the window is considered to leak if the memory retained after closing it grows
+# by more than this per cycle
+MAX_RETAINED_GROWTH_BYTES = 64 * 1024
+
+# subsystems by module path relative to the add-on folder, the first matching one is used
+ADDON_PATH = Path(config_window.__file__).parent.parent
+SUBSYSTEMS = [
+    ("ankiaddonconfig", "config framework"),
+    ("gui", "note types window"),
+    ("notetype_setting.py", "setting parsing and rewriting"),
+    ("notetype_setting_definitions.py", "template loading"),
+    ("utils.py", "note type updates"),
+]
+OTHER_ADDON_SUBSYSTEM = "other add-on code"
+OUTSIDE_ADDON_SUBSYSTEM = "outside the add-on"
+
+# settings changed in the edit phase, the general ones are applied to all note types
+EDITED_SETTINGS = {
+    "general.font_size": 24,
+    "general.autoflip": False,
+    "general.text_color": "#123456",
+    "AnKingOverhaul.image_height": 80,
+}
+
+MW_MODULES = [utils, manager, window, config_window, extra_notetype_versions]
+
+PHASES = ["open", "update", "edit", "save"]
+
+
+class FakeAddonManager:
+    "Keeps the add-on config in memory."
+
+    def __init__(self) -> None:
+        self._config = json.loads(
+            (ADDON_PATH / "config.json").read_text(encoding="utf-8")
+        )
+
+    def addonName(self, _: str) -> str:  # pylint: disable=invalid-name
+        return "AnKing Note Types"
+
+    def getConfig(self, _: str) -> Dict[str, Any]:  # pylint: disable=invalid-name
+        return json.loads(json.dumps(self._config))
+
+    def writeConfig(  # pylint: disable=invalid-name
+        self, _: str, config: Dict[str, Any]
+    ) -> None:
+        self._config = json.loads(json.dumps(config))
+
+
+class SyncTaskManager:
+    "Runs the tasks immediately, so that their memory is attributed to the current phase."
+
+    def with_progress(
+        self,
+        task: Callable[[], Any],
+        on_done: Optional[Callable[[Future], None]] = None,
+        **_: Any,
+    ) -> None:
+        future: Future = Future()
+        future.set_result(task())
+        if on_done is not None:
+            on_done(future)
+
+
+def subsystem_of(traceback: tracemalloc.Traceback) -> str:
+    # the frames are ordered from the oldest to the most recent call
+    for frame in reversed(traceback):
+        path = Path(frame.filename)
+        if ADDON_PATH not in path.parents:
+            continue
+        relative = path.relative_to(ADDON_PATH).as_posix()
+        for prefix, subsystem in SUBSYSTEMS:
+            if relative.startswith(prefix):
+                return subsystem
+        return OTHER_ADDON_SUBSYSTEM
+    return OUTSIDE_ADDON_SUBSYSTEM
+
+
+def bytes_by_subsystem(
+    snapshot: tracemalloc.Snapshot, baseline: tracemalloc.Snapshot
+) -> Dict[str, int]:
+    "Returns the memory allocated since the baseline by subsystem, the largest first."
+    result: Dict[str, int] = {}
+    for stat in snapshot.compare_to(baseline, "traceback"):
+        subsystem = subsystem_of(stat.traceback)
+        result[subsystem] = result.get(subsystem, 0) + stat.size_diff
+    return dict(sorted(result.items(), key=lambda item: item[1], reverse=True))
+
+
+@lru_cache(maxsize=None)
+def qt_application() -> QCoreApplication:
+    "Returns the Qt application, which is kept alive by the cache."
+    return QApplication.instance() or QApplication([])
+
+
+def collect_garbage() -> None:
+    # Closed windows and the connections of their signals to Python functions are deleted
+    # by Qt when the event loop runs, only then the functions can be garbage collected.
+    # QApplication.sendPostedEvents doesn't delete the connections.
+    # The connections of a window are only deleted by the loop after the one that
+    # deleted the window.
+    for _ in range(2):
+        loop = QEventLoop()
+        QTimer.singleShot(0, loop.quit)
+        loop.exec()
+    gc.collect()
+
+
+class WindowSession:
+    "Drives the note types window like a user would."
+
+    def __init__(self) -> None:
+        self.notetypes_window = config_window.NotetypesConfigWindow()
+
+    def open(self) -> None:
+        self.notetypes_window.open()
+
+    def update(self) -> None:
+        self.notetypes_window._update_all_notetypes_to_newest_version_and_reload_ui()
+
+    def edit(self) -> None:
+        conf = self.notetypes_window.conf
+        assert conf is not None and conf.config_window is not None
+        for key, value in EDITED_SETTINGS.items():
+            conf.set(key, value)
+        conf.config_window.update_widgets()
+
+    def save(self) -> None:
+        conf = self.notetypes_window.conf
+        assert conf is not None and conf.config_window is not None
+        conf.config_window.save_btn.click()
+        collect_garbage()
+
+
+def run_cycle() -> Tuple[Dict[str, float], Dict[str, Any]]:
+    "Returns the times of the phases and the memory stats of the cycle."
+    collect_garbage()
+    baseline = tracemalloc.take_snapshot()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+
+    session = WindowSession()
+    times = {}
+    phases = {}
+    for phase in PHASES:
+        phase_start_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        getattr(session, phase)()
+        times[phase] = time.perf_counter() - start
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        phases[phase] = {
+            "peak_bytes": peak_bytes - phase_start_bytes,
+            "held_bytes_by_subsystem": bytes_by_subsystem(
+                tracemalloc.take_snapshot(), baseline
+            ),
+        }
+
+    del session
+    collect_garbage()
+    end_bytes = tracemalloc.get_traced_memory()[0]
+    stats = {
+        "phases": phases,
+        "retained_bytes": end_bytes - start_bytes,
+        "retained_bytes_by_subsystem": bytes_by_subsystem(
+            tracemalloc.take_snapshot(), baseline
+        ),
+        "traced_bytes_after_close": end_bytes,
+    }
+    return times, stats
+
+
+def retained_growth_per_cycle(cycles: List[Dict[str, Any]]) -> float:
+    "Returns the slope of the least squares line through the traced memory after each cycle."
+    if len(cycles) < 2:
+        return 0.0
+    points = [(i, cycle["traced_bytes_after_close"]) for i, cycle in enumerate(cycles)]
+    mean_x = statistics.mean(x for x, _ in points)
+    mean_y = statistics.mean(y for _, y in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / sum(
+        (x - mean_x) ** 2 for x, _ in points
+    )
+
+
+def run(
+    cycles: int, warmup_cycles: int, spec: SyntheticCollectionSpec
+) -> BenchmarkResults:
+    results = BenchmarkResults("memory", cycles)
+    qt_application()
+
+    with tempfile.TemporaryDirectory() as tmp_dir, ExitStack() as patches:
+        template_path = Path(tmp_dir) / "template.anki2"
+        create_synthetic_collection(template_path, spec).close()
+        opened = OpenCollection(
+            template_path,
+            Path(tmp_dir) / "collection.anki2",
+            modules=MW_MODULES,
+            addonManager=FakeAddonManager(),
+            taskman=SyncTaskManager(),
+        )
+
+        # dialogs and the window geometry need a running Anki
+        patches.enter_context(
+            patch.object(config_window, "askUser", lambda *_, **__: True)
+        )
+        for module in [config_window, window, extra_notetype_versions]:
+            patches.enter_context(
+                patch.object(module, "tooltip", lambda *_, **__: None)
+            )
+        patches.enter_context(patch.object(window, "restoreGeom", lambda *_: None))
+        patches.enter_context(patch.object(window, "saveGeom", lambda *_: None))
+
+        cycle_times = []
+        cycle_stats = []
+        try:
+            # the first sessions fill the caches of the add-on, e.g. of the templates
+            for _ in range(warmup_cycles):
+                opened.reopen()
+                session = WindowSession()
+                for phase in PHASES:
+                    getattr(session, phase)()
+                del session
+
+            tracemalloc.start(TRACEBACK_FRAMES)
+            for i in range(cycles):
+                # each cycle starts with the same collection, so that there are updates
+                opened.reopen()
+                times, stats = run_cycle()
+                print(
+                    f"cycle {i + 1}: retained {stats['retained_bytes'] / 1024:.1f} KiB",
+                    file=sys.stderr,
+                )
+                cycle_times.append(times)
+                cycle_stats.append(stats)
+        finally:
+            tracemalloc.stop()
+            opened.close()
+
+    for phase in PHASES:
+        results.add([phase], [times[phase] for times in cycle_times])
+
+    growth = retained_growth_per_cycle(cycle_stats)
+    results.details = {
+        "cycles": cycle_stats,
+        "retained_growth_per_cycle_bytes": growth,
+        "leaks": growth > MAX_RETAINED_GROWTH_BYTES,
+    }
+    return results
+
+
+def print_report(details: Dict[str, Any]) -> None:
+    last_cycle = details["cycles"][-1]
+    print("\nPeak and held memory per phase (last cycle):", file=sys.stderr)
+    for phase, phase_stats in last_cycle["phases"].items():
+        print(
+            f"  {phase:<8} peak {phase_stats['peak_bytes'] / 1024:>10.1f} KiB",
+            file=sys.stderr,
+        )
+        for subsystem, size in phase_stats["held_bytes_by_subsystem"].items():
+            print(f"    {subsystem:<32} {size / 1024:>10.1f} KiB", file=sys.stderr)
+
+    print("\nRetained after closing the window (last cycle):", file=sys.stderr)
+    for subsystem, size in last_cycle["retained_bytes_by_subsystem"].items():
+        print(f"    {subsystem:<32} {size / 1024:>10.1f} KiB", file=sys.stderr)
+
+    print(
+        f"\nGrowth of the retained memory: "
+        f"{details['retained_growth_per_cycle_bytes'] / 1024:.1f} KiB per cycle "
+        f"(at most {MAX_RETAINED_GROWTH_BYTES / 1024:.0f} KiB allowed)",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=DEFAULT_CYCLES)
+    parser.add_argument(
+        "--warmup-cycles",
+        type=int,
+        default=DEFAULT_WARMUP_CYCLES,
+        help="cycles that aren't measured, e.g. for filling caches",
+    )
+    parser.add_argument("--notes", type=int, default=DEFAULT_NOTES)
+    parser.add_argument(
+        "--notetype",
+        action="append",
+        dest="notetypes",
+        help="add this note type to the collection (can be given multiple times), "
+        f"defaults to {', '.join(DEFAULT_NOTETYPES)}",
+    )
+    parser.add_argument("--output", type=Path, help="defaults to stdout")
+    args = parser.parse_args()
+
+    # the window is never shown
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    spec = SyntheticCollectionSpec(
+        notes=args.notes,
+        notetype_names=args.notetypes or DEFAULT_NOTETYPES,
+        copies_per_notetype=0,
+    )
+    results = run(args.cycles, args.warmup_cycles, spec)
+    results.write(args.output)
+    print_report(results.details)
+
+    if results.details["leaks"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
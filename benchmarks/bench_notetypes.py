@@ -0,0 +1,124 @@
+# Measures parsing and rewriting of the bundled note types, without Anki running.
+# Results are grouped per note type and per setting type and written as JSON,
+# which can be compared with the results of another run using benchmarks/compare.py.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_notetypes --output before.json
+#   python -m benchmarks.bench_notetypes --output after.json
+#   python -m benchmarks.compare before.json after.json
+
+import argparse
+import sys
+from copy import deepcopy
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src.anking_notetypes.gui.config_window import ntss_for_model
+from src.anking_notetypes.notetype_setting import NotetypeSetting
+from src.anking_notetypes.notetype_setting_definitions import (
+    anking_notetype_model,
+    anking_notetype_names,
+)
+from src.anking_notetypes.utils import adjust_fields, update_notetype_to_newest_version
+
+from .common import BenchmarkResults, time_runs
+
+DEFAULT_RUNS = 5
+
+
+def run(runs: int, notetype_names: List[str]) -> BenchmarkResults:
+    results = BenchmarkResults("notetypes", runs)
+    for name in notetype_names:
+        print(name, file=sys.stderr)
+        model = anking_notetype_model(name)
+        _bench_notetype(results, name, model, runs)
+    return results
+
+
+def _bench_notetype(
+    results: BenchmarkResults, name: str, model: Dict[str, Any], runs: int
+) -> None:
+    results.add(
+        [f"ntss_for_model/notetype/{name}"],
+        time_runs(lambda: ntss_for_model(model), runs),
+    )
+
+    ntss = ntss_for_model(model)
+    # updated_model only uses the get method of the ConfigManager
+    conf: Any = {nts.key(name): nts.setting_value(model) for nts in ntss}
+    for nts in ntss:
+        setting_type = nts.config["type"]
+        results.add(
+            [
+                f"setting_value/notetype/{name}",
+                f"setting_value/setting_type/{setting_type}",
+            ],
+            time_runs(partial(nts.setting_value, model), runs),
+        )
+        results.add(
+            [
+                f"updated_model/notetype/{name}",
+                f"updated_model/setting_type/{setting_type}",
+            ],
+            time_runs(partial(nts.updated_model, model, name, conf), runs),
+        )
+
+    results.add(
+        [f"full_rewrite/notetype/{name}"],
+        time_runs(lambda: _rewrite_all_settings(model, name, ntss, conf), runs),
+    )
+
+    old_model = deepcopy(model)
+    # a field that only exists in the collection, it's kept by the update
+    old_model["flds"].append({**old_model["flds"][-1], "name": "Local Field"})
+    target: Dict[str, Any] = {}
+
+    def reset_target() -> None:
+        target.clear()
+        target.update(deepcopy(old_model))
+
+    results.add(
+        [f"update_notetype_to_newest_version/notetype/{name}"],
+        time_runs(
+            lambda: update_notetype_to_newest_version(target, name),  # type: ignore
+            runs,
+            setup=reset_target,
+        ),
+    )
+    results.add(
+        [f"adjust_fields/notetype/{name}"],
+        time_runs(lambda: adjust_fields(old_model["flds"], model["flds"]), runs),
+    )
+
+
+def _rewrite_all_settings(
+    model: Dict[str, Any],
+    name: str,
+    ntss: List[NotetypeSetting],
+    conf: Any,
+) -> None:
+    # like NotetypesConfigWindow._safe_update_model_settings
+    model = deepcopy(model)
+    for nts in ntss:
+        model.update(nts.updated_model(model, name, conf))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument(
+        "--notetype",
+        action="append",
+        dest="notetypes",
+        help="only benchmark this note type (can be given multiple times)",
+    )
+    parser.add_argument("--output", type=Path, help="defaults to stdout")
+    args = parser.parse_args()
+
+    results = run(args.runs, args.notetypes or sorted(anking_notetype_names()))
+    results.write(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# Measures the cost of the regular expressions of the note type settings (setting_configs).
+# Every setting regex is searched in every template text it applies to (front, back or style)
+# of the bundled note types and optionally of the AnKing note types of a collection,
+# like ntss_for_model does when reading the settings of a note type.
+# Results are grouped per setting and per note type and written as JSON, which can be
+# compared with the results of another run using benchmarks/compare.py.
+#
+# A ranking of the most expensive settings is printed to stderr, together with searches that
+# take much longer per character than the other searches in the same text, which usually
+# means that the regex backtracks a lot. The growth of the cost with the size of the templates
+# is measured by searching in synthetic padding of increasing size, settings whose cost grows
+# superlinearly are flagged and make the script exit with status 1.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_regex --output regex.json
+#   python -m benchmarks.bench_regex --collection path/to/collection.anki2
+
+import argparse
+import math
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+from src.anking_notetypes.notetype_setting_definitions import (
+    anking_notetype_model,
+    anking_notetype_names,
+    notetype_base_name,
+    setting_configs,
+)
+
+from .common import BenchmarkResults, time_runs
+
+DEFAULT_RUNS = 5
+DEFAULT_TOP = 15
+
+# searches that take this many times longer per character than the median search
+# in the same text are reported as backtracking-heavy
+BACKTRACKING_FACTOR = 10
+# searches faster than this are too noisy to be reported
+MIN_REPORTED_SECS = 0.00002
+
+# the padding is the template text repeated this many times
+PADDING_FACTORS = [1, 2, 4, 8, 16]
+# the padding isn't grown further once a search takes longer than this
+MAX_PADDED_SEARCH_SECS = 0.5
+# settings whose search time grows faster than chars ** SUPERLINEAR_EXPONENT are flagged
+SUPERLINEAR_EXPONENT = 1.5
+
+
+class TemplateSource(NamedTuple):
+    name: str
+    # template texts by file ("front", "back" or "style")
+    texts: Dict[str, str]
+
+
+class SearchTiming(NamedTuple):
+    setting: str
+    source: str
+    file: str
+    chars: int
+    secs: float
+    matched: bool
+
+
+def model_texts(model: Dict[str, Any]) -> Dict[str, str]:
+    # all the AnKing note types have one template each
+    template = model["tmpls"][0]
+    return {"front": template["qfmt"], "back": template["afmt"], "style": model["css"]}
+
+
+def bundled_sources(notetype_names: List[str]) -> List[TemplateSource]:
+    return [
+        TemplateSource(name, model_texts(anking_notetype_model(name)))
+        for name in notetype_names
+    ]
+
+
+def collection_sources(path: Path) -> List[TemplateSource]:
+    "Returns the AnKing note types of the collection, which is copied so that it isn't changed."
+    # imported here so that the other benchmarks can be run without the anki package
+    from anki.collection import Collection
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        copy_path = Path(tmp_dir) / "collection.anki2"
+        shutil.copyfile(path, copy_path)
+        col = Collection(str(copy_path))
+        try:
+            return [
+                TemplateSource(f"collection/{model['name']}", model_texts(model))
+                for model in col.models.all()
+                if notetype_base_name(model["name"]) and len(model["tmpls"]) == 1
+            ]
+        finally:
+            col.close()
+
+
+def setting_files(config: Dict[str, Any]) -> List[str]:
+    return [config["file"]] if isinstance(config["file"], str) else config["file"]
+
+
+def time_searches(
+    results: BenchmarkResults, sources: List[TemplateSource], runs: int
+) -> List[SearchTiming]:
+    """Searches each setting regex in the texts of all sources, adds the times to results
+    and returns the median time of each search."""
+    timings = []
+    for source in sources:
+        for name, config in setting_configs.items():
+            pattern = re.compile(config["regex"])
+            for file in setting_files(config):
+                text = source.texts[file]
+                times = time_runs(partial(pattern.search, text), runs)
+                results.add(
+                    [f"search/setting/{name}", f"search/notetype/{source.name}"], times
+                )
+                timings.append(
+                    SearchTiming(
+                        setting=name,
+                        source=source.name,
+                        file=file,
+                        chars=len(text),
+                        secs=statistics.median(times),
+                        matched=bool(pattern.search(text)),
+                    )
+                )
+    return timings
+
+
+def worst_settings(timings: List[SearchTiming], top: int) -> List[Dict[str, Any]]:
+    "Returns the settings with the highest total search time, the most expensive first."
+    timings_by_setting: Dict[str, List[SearchTiming]] = {}
+    for timing in timings:
+        timings_by_setting.setdefault(timing.setting, []).append(timing)
+
+    result = []
+    for setting, setting_timings in timings_by_setting.items():
+        worst = max(setting_timings, key=lambda timing: timing.secs)
+        result.append(
+            {
+                "setting": setting,
+                "total_secs": sum(timing.secs for timing in setting_timings),
+                "worst_source": worst.source,
+                "worst_file": worst.file,
+                "worst_secs": worst.secs,
+            }
+        )
+    result.sort(key=lambda entry: entry["total_secs"], reverse=True)
+    return result[:top]
+
+
+def backtracking_suspects(timings: List[SearchTiming]) -> List[Dict[str, Any]]:
+    """Returns the searches that take much longer per character than the median search
+    in the same text, the most expensive first."""
+    timings_by_text: Dict[tuple, List[SearchTiming]] = {}
+    for timing in timings:
+        timings_by_text.setdefault((timing.source, timing.file), []).append(timing)
+
+    result = []
+    for text_timings in timings_by_text.values():
+        median_secs = statistics.median(timing.secs for timing in text_timings)
+        for timing in text_timings:
+            if timing.secs < MIN_REPORTED_SECS:
+                continue
+            if timing.secs > BACKTRACKING_FACTOR * median_secs:
+                result.append(
+                    {
+                        **timing._asdict(),
+                        "times_median": timing.secs / median_secs,
+                    }
+                )
+    result.sort(key=lambda entry: entry["secs"], reverse=True)
+    return result
+
+
+def growth_exponent(pattern: Pattern, padding: str, runs: int) -> Optional[float]:
+    """Returns the exponent of the growth of the search time of the pattern with the size
+    of the text, estimated by searching in the padding repeated PADDING_FACTORS times.
+    Returns None if the times are too short to estimate it."""
+    points = []
+    for factor in PADDING_FACTORS:
+        text = padding * factor
+        secs = min(time_runs(partial(pattern.search, text), runs))
+        if secs >= MIN_REPORTED_SECS:
+            points.append((len(text), secs))
+        if secs > MAX_PADDED_SEARCH_SECS:
+            break
+    return log_log_slope(points)
+
+
+def log_log_slope(points: List[Tuple[int, float]]) -> Optional[float]:
+    """Returns the slope of the least squares line through the (chars, secs) points
+    on a log-log scale, which is the exponent of the growth of secs with chars.
+    Returns None if there are less than two points."""
+    if len(points) < 2:
+        return None
+
+    log_points = [(math.log(chars), math.log(secs)) for chars, secs in points]
+    mean_x = statistics.mean(x for x, _ in log_points)
+    mean_y = statistics.mean(y for _, y in log_points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in log_points) / sum(
+        (x - mean_x) ** 2 for x, _ in log_points
+    )
+
+
+def growth_exponents(sources: List[TemplateSource], runs: int) -> Dict[str, float]:
+    """Returns the growth exponents of the settings whose growth could be estimated.
+    The padding of a setting is the longest text it applies to with its matches removed,
+    so that the regex has to scan all of it, like when a setting isn't present."""
+    result = {}
+    for name, config in setting_configs.items():
+        pattern = re.compile(config["regex"])
+        texts = [
+            source.texts[file] for source in sources for file in setting_files(config)
+        ]
+        padding = pattern.sub("", max(texts, key=len))
+        if not padding:
+            continue
+        exponent = growth_exponent(pattern, padding, runs)
+        if exponent is not None:
+            result[name] = exponent
+    return result
+
+
+def run(runs: int, sources: List[TemplateSource], top: int) -> BenchmarkResults:
+    results = BenchmarkResults("regex", runs)
+
+    print("Searching in templates", file=sys.stderr)
+    timings = time_searches(results, sources, runs)
+
+    print("Searching in padded templates", file=sys.stderr)
+    exponents = growth_exponents(sources, runs)
+
+    results.details = {
+        "worst_settings": worst_settings(timings, top),
+        "backtracking_suspects": backtracking_suspects(timings),
+        "growth_exponents": dict(sorted(exponents.items())),
+        "superlinear_settings": sorted(
+            name
+            for name, exponent in exponents.items()
+            if exponent > SUPERLINEAR_EXPONENT
+        ),
+    }
+    return results
+
+
+def print_report(details: Dict[str, Any], top: int) -> None:
+    print("\nMost expensive settings (total of all searches):", file=sys.stderr)
+    for entry in details["worst_settings"]:
+        print(
+            f"  {entry['setting']:<45} {entry['total_secs'] * 1000:>9.3f} ms  "
+            f"worst: {entry['worst_source']} ({entry['worst_file']}) "
+            f"{entry['worst_secs'] * 1000:.3f} ms",
+            file=sys.stderr,
+        )
+
+    suspects = details["backtracking_suspects"]
+    print("\nBacktracking-heavy searches:", file=sys.stderr)
+    for entry in suspects[:top]:
+        print(
+            f"  {entry['setting']:<45} {entry['secs'] * 1000:>9.3f} ms  "
+            f"{entry['times_median']:.0f}x the median in {entry['source']} ({entry['file']})",
+            file=sys.stderr,
+        )
+    if len(suspects) > top:
+        print(f"  ... and {len(suspects) - top} more", file=sys.stderr)
+    if not suspects:
+        print("  none", file=sys.stderr)
+
+    print(
+        f"\nSettings whose cost grows faster than size ** {SUPERLINEAR_EXPONENT}:",
+        file=sys.stderr,
+    )
+    for name in details["superlinear_settings"]:
+        print(
+            f"  {name:<45} exponent {details['growth_exponents'][name]:.2f}",
+            file=sys.stderr,
+        )
+    if not details["superlinear_settings"]:
+        print("  none", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument(
+        "--notetype",
+        action="append",
+        dest="notetypes",
+        help="only use this bundled note type (can be given multiple times)",
+    )
+    parser.add_argument(
+        "--collection",
+        type=Path,
+        help="also use the AnKing note types of this collection",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=DEFAULT_TOP,
+        help="number of settings and searches in the report",
+    )
+    parser.add_argument("--output", type=Path, help="defaults to stdout")
+    args = parser.parse_args()
+
+    sources = bundled_sources(args.notetypes or sorted(anking_notetype_names()))
+    if args.collection:
+        sources.extend(collection_sources(args.collection))
+
+    results = run(args.runs, sources, args.top)
+    results.write(args.output)
+    print_report(results.details, args.top)
+
+    if results.details["superlinear_settings"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
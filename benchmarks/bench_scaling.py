@@ -0,0 +1,187 @@
+# pylint: disable=protected-access
+# Measures the collection-facing code of the add-on on synthetic collections of different sizes
+# (see synthetic_collection.py). Anki doesn't have to be running, the code is run against
+# collections opened with the anki package.
+# Results are grouped per measured function and collection size and written as JSON,
+# which can be compared with the results of another run using benchmarks/compare.py.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_scaling --sizes 1000,10000,100000 --output scaling.json
+
+import argparse
+import shutil
+import sys
+import tempfile
+from concurrent.futures import Future
+from contextlib import ExitStack
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+from unittest.mock import patch
+
+from anki.collection import Collection
+
+import src.anking_notetypes as anking_notetypes
+from src.anking_notetypes import utils
+from src.anking_notetypes.gui import config_window, extra_notetype_versions
+from src.anking_notetypes.notetype_setting_definitions import anking_notetype_names
+
+from .common import BenchmarkResults, time_runs
+from .synthetic_collection import SyntheticCollectionSpec, create_synthetic_collection
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_RUNS = 3
+
+# modules whose functions are measured, their mw is replaced by a stand-in with the collection
+MW_MODULES = [anking_notetypes, utils, config_window, extra_notetype_versions]
+
+
+class OpenCollection:
+    """Keeps a collection open and the measured modules pointing to it.
+    reopen() replaces the collection with a fresh copy of the template file,
+    which is used for measuring functions that change the collection.
+    mw_attrs are added to the stand-in for mw, e.g. an add-on manager."""
+
+    def __init__(
+        self,
+        template_path: Path,
+        work_path: Path,
+        modules: Optional[List[ModuleType]] = None,
+        **mw_attrs: Any,
+    ) -> None:
+        self.template_path = template_path
+        self.work_path = work_path
+        self.modules = modules if modules is not None else MW_MODULES
+        self.mw_attrs = mw_attrs
+        self.col: Optional[Collection] = None
+        self._patches = ExitStack()
+
+    def reopen(self) -> None:
+        self.close()
+        shutil.copyfile(self.template_path, self.work_path)
+        self.col = Collection(str(self.work_path))
+        mw = SimpleNamespace(col=self.col, reset=lambda: None, **self.mw_attrs)
+        for module in self.modules:
+            self._patches.enter_context(patch.object(module, "mw", mw))
+        # tooltips need a running Qt application
+        self._patches.enter_context(
+            patch.object(extra_notetype_versions, "tooltip", lambda *_: None)
+        )
+        # the caches are keyed by the collection path, which is the same for all copies
+        utils._field_names_by_mid_cache = None
+        extra_notetype_versions._extra_notetype_versions_cache = None
+
+    def close(self) -> None:
+        self._patches.close()
+        if self.col is not None:
+            self.col.close()
+            self.col = None
+
+
+def run(runs: int, sizes: List[int], spec: SyntheticCollectionSpec) -> BenchmarkResults:
+    results = BenchmarkResults("scaling", runs)
+    for size in sizes:
+        print(f"{size} notes", file=sys.stderr)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            template_path = Path(tmp_dir) / "template.anki2"
+            create_synthetic_collection(
+                template_path, spec._replace(notes=size)
+            ).close()
+
+            opened = OpenCollection(template_path, Path(tmp_dir) / "collection.anki2")
+            try:
+                opened.reopen()
+                _bench_collection(results, opened, size, runs)
+            finally:
+                opened.close()
+    return results
+
+
+def _bench_collection(
+    results: BenchmarkResults, opened: OpenCollection, size: int, runs: int
+) -> None:
+    def add(name: str, fn: Callable[[], Any], setup: Optional[Callable] = None):
+        results.add([f"{name}/notes/{size}"], time_runs(fn, runs, setup=setup))
+
+    notetype_names = sorted(anking_notetype_names())
+    add(
+        "note_type_versions",
+        lambda: [utils.note_type_versions(name) for name in notetype_names],
+    )
+    add("models_with_available_updates", utils.models_with_available_updates)
+
+    def clear_extra_notetype_versions_cache() -> None:
+        extra_notetype_versions._extra_notetype_versions_cache = None
+
+    add(
+        "find_extra_notetype_versions",
+        extra_notetype_versions._find_extra_notetype_versions,
+        setup=clear_extra_notetype_versions_cache,
+    )
+
+    nids = opened.col.find_notes("")  # type: ignore
+
+    def clear_field_names_cache() -> None:
+        utils._field_names_by_mid_cache = None
+
+    add(
+        "hint_fields_for_nids",
+        lambda: anking_notetypes.hint_fields_for_nids(nids),
+        setup=clear_field_names_cache,
+    )
+    add(
+        "set_autoopen_tags",
+        lambda: anking_notetypes.set_autoopen_tags(nids, ["autoopen::lecture_notes"]),
+        setup=opened.reopen,
+    )
+
+    # converting changes the note types, so each run uses a fresh copy of the collection
+    copy_mids: Dict[str, List[int]] = {}
+
+    def prepare_conversion() -> None:
+        opened.reopen()
+        copy_mids.clear()
+        copy_mids.update(
+            extra_notetype_versions._find_extra_notetype_versions().copy_mids_by_notetype_base_name
+        )
+
+    def convert() -> None:
+        future: Future = Future()
+        future.set_result(None)
+        extra_notetype_versions.convert_extra_notetypes(future, copy_mids)
+
+    add("convert_extra_notetypes", convert, setup=prepare_conversion)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(x) for x in value.split(",")],
+        default=DEFAULT_SIZES,
+        help="comma-separated numbers of notes",
+    )
+    parser.add_argument(
+        "--notetype",
+        action="append",
+        dest="notetypes",
+        help="only add this note type to the collections (can be given multiple times)",
+    )
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--ankihub-versions", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="defaults to stdout")
+    args = parser.parse_args()
+
+    spec = SyntheticCollectionSpec(
+        notes=0,
+        notetype_names=args.notetypes,
+        copies_per_notetype=args.copies,
+        ankihub_versions_per_notetype=args.ankihub_versions,
+    )
+    results = run(args.runs, args.sizes, spec)
+    results.write(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+REPO_PATH = Path(__file__).parent.parent
+
+# format of the result files, increase it when the format changes in an incompatible way
+RESULTS_FORMAT_VERSION = 1
+
+
+class BenchmarkResults:
+    """Collects the run times of benchmarks.
+    The times of a run of several measurements can be added to the same group,
+    e.g. the times of all settings of one type are summed up per run."""
+
+    def __init__(self, benchmark: str, runs: int) -> None:
+        self.benchmark = benchmark
+        self.runs = runs
+        self._times: Dict[str, List[float]] = defaultdict(lambda: [0.0] * runs)
+        # additional findings of the benchmark, they aren't compared by compare.py
+        self.details: Dict[str, Any] = {}
+
+    def add(self, groups: List[str], times: List[float]) -> None:
+        assert len(times) == self.runs
+        for group in groups:
+            group_times = self._times[group]
+            for i, t in enumerate(times):
+                group_times[i] += t
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "format_version": RESULTS_FORMAT_VERSION,
+            "benchmark": self.benchmark,
+            "meta": _meta(),
+            "runs": self.runs,
+            "results": {
+                group: summarize(times) for group, times in sorted(self._times.items())
+            },
+        }
+        if self.details:
+            result["details"] = self.details
+        return result
+
+    def write(self, output: Optional[Path]) -> None:
+        "Writes the results as JSON to output or to stdout if output is None."
+        text = json.dumps(self.to_dict(), indent=2)
+        if output is None:
+            print(text)
+        else:
+            output.write_text(text, encoding="utf-8")
+            print(f"Results written to {output}", file=sys.stderr)
+
+
+def time_runs(
+    fn: Callable[[], Any],
+    runs: int,
+    setup: Optional[Callable[[], None]] = None,
+) -> List[float]:
+    """Returns the times of runs calls of fn in seconds.
+    setup is called before each call and not included in the times."""
+    result = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        result.append(time.perf_counter() - start)
+    return result
+
+
+def summarize(times: List[float]) -> Dict[str, float]:
+    return {
+        "median_secs": statistics.median(times),
+        "min_secs": min(times),
+        "max_secs": max(times),
+    }
+
+
+def load_results(path: Path) -> Dict[str, Any]:
+    results = json.loads(path.read_text(encoding="utf-8"))
+    if results.get("format_version") != RESULTS_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported results format version: {results.get('format_version')}"
+        )
+    return results
+
+
+def _meta() -> Dict[str, Any]:
+    return {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "commit": _git_commit(),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_PATH,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
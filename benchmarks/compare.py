@@ -0,0 +1,88 @@
+# Compares two result files of the same benchmark, e.g. from before and after a change.
+# Prints the median times of each group and their ratio. Exits with status 1 if a group
+# got slower by more than the threshold, so that it can be used in scripts.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.compare before.json after.json [--threshold 1.2]
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .common import load_results
+
+# groups that take less time than this are too noisy to be compared
+MIN_COMPARED_SECS = 0.0001
+
+
+def compare_results(
+    old: Dict[str, Any], new: Dict[str, Any], threshold: float
+) -> Tuple[List[List[str]], List[str]]:
+    """Returns the rows of the comparison table and the names of the groups that
+    got slower by more than the threshold (a ratio of the median times)."""
+    if old["benchmark"] != new["benchmark"]:
+        raise ValueError(
+            f"Can't compare results of {old['benchmark']} with results of {new['benchmark']}"
+        )
+
+    rows = []
+    regressions = []
+    for group in sorted(set(old["results"]) | set(new["results"])):
+        old_secs = _median_secs(old, group)
+        new_secs = _median_secs(new, group)
+        ratio = None
+        if old_secs is not None and new_secs is not None:
+            if max(old_secs, new_secs) >= MIN_COMPARED_SECS:
+                ratio = new_secs / old_secs if old_secs else float("inf")
+        if ratio is not None and ratio > threshold:
+            regressions.append(group)
+        rows.append(
+            [
+                group,
+                _format_secs(old_secs),
+                _format_secs(new_secs),
+                f"{ratio:.2f}x" if ratio is not None else "-",
+            ]
+        )
+    return rows, regressions
+
+
+def _median_secs(results: Dict[str, Any], group: str) -> Optional[float]:
+    group_results = results["results"].get(group)
+    return group_results["median_secs"] if group_results else None
+
+
+def _format_secs(secs: Optional[float]) -> str:
+    return f"{secs * 1000:.3f} ms" if secs is not None else "-"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="ratio of the median times above which a group counts as slower",
+    )
+    args = parser.parse_args()
+
+    rows, regressions = compare_results(
+        load_results(args.old), load_results(args.new), args.threshold
+    )
+    header = ["group", "old", "new", "new/old"]
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+    for row in [header, *rows]:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+    if regressions:
+        print(f"\n{len(regressions)} group(s) got slower:", file=sys.stderr)
+        for group in regressions:
+            print(f"  {group}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
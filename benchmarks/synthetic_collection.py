@@ -0,0 +1,186 @@
+# Creates throwaway Anki collections with versions of the AnKing note types and many notes,
+# for measuring how the collection-facing code of the add-on scales (see bench_scaling.py).
+# Each bundled note type is added as a main version, copies like "AnKingOverhaul-1dgs0" and
+# AnkiHub versions like "AnKingOverhaul (Deck / User)". Mains that were renamed can be added
+# with their legacy names. The notes are spread evenly over all versions.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.synthetic_collection /tmp/synthetic.anki2 --notes 10000
+
+import argparse
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from anki.collection import Collection
+from anki.utils import guid64
+
+from src.anking_notetypes.notetype_renames import legacy_notetype_names
+from src.anking_notetypes.notetype_setting_definitions import (
+    anking_notetype_model,
+    anking_notetype_names,
+)
+
+# version of the AnkiHub versions of the note types, so that updates are available for them
+OUTDATED_VERSION = "0"
+
+# every IMAGE_NOTES_INTERVAL-th note has an image, every AUTOOPEN_NOTES_INTERVAL-th note
+# has an autoopen tag
+IMAGE_NOTES_INTERVAL = 5
+AUTOOPEN_NOTES_INTERVAL = 10
+
+NOTES_INSERT_CHUNK_SIZE = 10000
+
+
+class SyntheticCollectionSpec(NamedTuple):
+    # total number of notes
+    notes: int
+    # base names of the note types, all bundled note types if None
+    notetype_names: Optional[List[str]] = None
+    copies_per_notetype: int = 1
+    ankihub_versions_per_notetype: int = 1
+    # add mains with their legacy names if they have one (e.g. "AnKingMCAT")
+    legacy_names: bool = True
+    seed: int = 0
+
+
+def create_synthetic_collection(
+    path: Path, spec: SyntheticCollectionSpec
+) -> Collection:
+    """Creates a new collection at path according to spec and returns it opened.
+    The caller is responsible for closing it."""
+    if path.exists():
+        raise FileExistsError(path)
+
+    rng = random.Random(spec.seed)
+    col = Collection(str(path))
+    mids = []
+    for base_name in spec.notetype_names or sorted(anking_notetype_names()):
+        mids.extend(_add_notetype_versions(col, base_name, spec, rng))
+    _add_notes(col, mids, spec.notes)
+    return col
+
+
+def _add_notetype_versions(
+    col: Collection,
+    base_name: str,
+    spec: SyntheticCollectionSpec,
+    rng: random.Random,
+) -> List[int]:
+    legacy_names = legacy_notetype_names(base_name)
+    main_name = legacy_names[0] if spec.legacy_names and legacy_names else base_name
+
+    names = [main_name]
+    for _ in range(spec.copies_per_notetype):
+        suffix = "".join(rng.choices(string.ascii_letters + string.digits, k=5))
+        names.append(f"{main_name}-{suffix}")
+    for i in range(spec.ankihub_versions_per_notetype):
+        names.append(f"{main_name} (Synthetic Deck {i + 1} / SyntheticUser)")
+
+    result = []
+    for name in names:
+        model = anking_notetype_model(base_name)
+        model["id"] = 0
+        model["name"] = name
+        if name.endswith(")"):
+            template = model["tmpls"][0]
+            template["qfmt"] = re.sub(
+                r"^<!-- version [\w\d]+ -->\n",
+                f"<!-- version {OUTDATED_VERSION} -->\n",
+                template["qfmt"],
+            )
+        result.append(col.models.add_dict(model).id)  # type: ignore
+    return result
+
+
+def _add_notes(col: Collection, mids: List[int], count: int) -> None:
+    # notes are inserted directly because adding them one by one takes too long
+    # for large collections, Anki then updates the sort fields and checksums and creates the cards
+    field_counts = {mid: len(col.models.get(mid)["flds"]) for mid in mids}  # type: ignore
+    now = int(time.time())
+    first_nid = now * 1000
+    nids = []
+    for start in range(0, count, NOTES_INSERT_CHUNK_SIZE):
+        rows = []
+        for i in range(start, min(start + NOTES_INSERT_CHUNK_SIZE, count)):
+            mid = mids[i % len(mids)]
+            nid = first_nid + i
+            rows.append(
+                (
+                    nid,
+                    guid64(),
+                    mid,
+                    now,
+                    -1,
+                    _note_tags(i),
+                    "\x1f".join(_note_fields(i, field_counts[mid])),
+                    "",
+                    0,
+                    0,
+                    "",
+                )
+            )
+            nids.append(nid)
+        col.db.executemany(
+            "insert into notes values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+    col.after_note_updates(nids, mark_modified=False, generate_cards=True)  # type: ignore
+
+
+def _note_fields(i: int, field_count: int) -> List[str]:
+    fields = [""] * field_count
+    # the first field is the text field of cloze note types and the front of the others
+    fields[0] = f"Synthetic note {i} with a {{{{c1::cloze deletion}}}}"
+    if field_count > 1:
+        fields[1] = f"Extra information of note {i}"
+        if i % IMAGE_NOTES_INTERVAL == 0:
+            fields[1] += f'<br><img src="synthetic_{i}.png">'
+    return fields
+
+
+def _note_tags(i: int) -> str:
+    tags = ["synthetic"]
+    if i % AUTOOPEN_NOTES_INTERVAL == 0:
+        tags.append("autoopen::extra")
+    return f" {' '.join(tags)} "
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument(
+        "--notetype",
+        action="append",
+        dest="notetypes",
+        help="only add this note type (can be given multiple times)",
+    )
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--ankihub-versions", type=int, default=1)
+    parser.add_argument("--no-legacy-names", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    spec = SyntheticCollectionSpec(
+        notes=args.notes,
+        notetype_names=args.notetypes,
+        copies_per_notetype=args.copies,
+        ankihub_versions_per_notetype=args.ankihub_versions,
+        legacy_names=not args.no_legacy_names,
+        seed=args.seed,
+    )
+    col = create_synthetic_collection(args.path, spec)
+    print(
+        f"Created {args.path} with {col.note_count()} notes "
+        f"and {len(col.models.all_names_and_ids())} note types",
+        file=sys.stderr,
+    )
+    col.close()
+
+
+if __name__ == "__main__":
+    main()
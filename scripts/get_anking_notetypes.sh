@@ -11,3 +11,5 @@ mv "Note Types" src/anking_notetypes/note_types
 rm -r src/anking_notetypes/resources
 gitdir https://github.com/AnKingMed/AnKing-Note-Types/tree/master/resources
 cp -r resources src/anking_notetypes/resources
+
+python scripts/optimize_resources.py
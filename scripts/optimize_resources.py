@@ -0,0 +1,69 @@
+# Creates downscaled and recompressed variants of the bundled images in
+# src/anking_notetypes/resources/optimized.
+# The add-on uses them instead of the originals for the config window icons and when copying
+# the resources into the media folder. The variants keep the file names of the originals,
+# so that templates and existing cards keep working.
+# Run this after updating the resources (get_anking_notetypes.sh does this). Requires Pillow.
+
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+RESOURCES_PATH = Path(__file__).parent.parent / "src" / "anking_notetypes" / "resources"
+OPTIMIZED_RESOURCES_PATH = RESOURCES_PATH / "optimized"
+
+# Maximum width and height of the variants.
+# The sizes leave room for high DPI screens (3x of the size the image is shown at).
+MAX_SIZES = {
+    # config window icons (shown at up to 64x64)
+    "AnKingSmall.png": 192,
+    "YouTube.png": 96,
+    "Instagram.png": 96,
+    "Facebook.png": 96,
+    "Patreon.png": 663,
+    # shown with a height of 50px by the AnKingDerm and AnKingDermPath note types
+    "_dermki_text.png": 400,
+}
+# used for images that are not in MAX_SIZES, e.g. logos that users put on their cards
+DEFAULT_MAX_SIZE = 1024
+
+IMAGE_SUFFIXES = [".png", ".jpg", ".jpeg"]
+
+# variants that don't save at least this fraction of the original size are not kept
+MIN_SAVING = 0.1
+
+
+def optimize_image(path: Path, target: Path, max_size: int) -> bool:
+    """Writes a downscaled and recompressed copy of the image to target.
+    Returns False and doesn't keep the copy if it isn't notably smaller than the original."""
+    with Image.open(path) as image:
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        image.save(target, optimize=True)
+
+    if target.stat().st_size > path.stat().st_size * (1 - MIN_SAVING):
+        target.unlink()
+        return False
+    return True
+
+
+def main() -> None:
+    OPTIMIZED_RESOURCES_PATH.mkdir(exist_ok=True)
+    for path in OPTIMIZED_RESOURCES_PATH.iterdir():
+        path.unlink()
+
+    for path in sorted(RESOURCES_PATH.iterdir()):
+        if not path.is_file() or path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+
+        target = OPTIMIZED_RESOURCES_PATH / path.name
+        max_size = MAX_SIZES.get(path.name, DEFAULT_MAX_SIZE)
+        if optimize_image(path, target, max_size):
+            print(
+                f"{path.name}: {path.stat().st_size} -> {target.stat().st_size} bytes",
+                file=sys.stderr,
+            )
+
+
+if __name__ == "__main__":
+    main()
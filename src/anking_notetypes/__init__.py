@@ -1,49 +1,52 @@
 from concurrent.futures import Future
 from pathlib import Path
-from typing import TYPE_CHECKING, List, Sequence
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence
 
 if TYPE_CHECKING:
     from anki.notes import Note, NoteId
 
-from anki.utils import ids2str
 from aqt import mw
 from aqt.browser import Browser
 from aqt.gui_hooks import (
     browser_will_show_context_menu,
     card_layout_will_show,
     profile_did_open,
+    profile_will_close,
 )
 from aqt.qt import QMenu, QPushButton
-from aqt.utils import askUserDialog, tooltip
+from aqt.utils import askUserDialog, getText, tooltip
 
-from . import editor
+# Only modules needed for registering the hooks are imported here. The config window,
+# the note type setting definitions and the other modules that are only needed once the user
+# does something are imported where they are used, so that importing the add-on is fast.
+from . import editor, timing
 from .compat import add_compat_aliases
-from .gui.config_window import (
-    NotetypesConfigWindow,
-    models_with_available_updates,
-    note_type_version,
-)
-from .gui.menu import setup_menu
-from .gui.utils import choose_subset
-from .notetype_setting_definitions import (
-    HINT_BUTTONS,
-    anking_notetype_models,
-)
+from .gui.menu import setup_menu, setup_restore_snapshot_menu
+from .media_resources import sync_resources_into_media_folder
 
 ADDON_DIR_NAME = str(Path(__file__).parent.name)
-RESOURCES_PATH = Path(__file__).parent / "resources"
+
+AUTOOPEN_TAG_PREFIX = "autoopen::"
+
+# number of notes whose tags are changed in one bulk operation when updating the autoopen tags
+AUTOOPEN_TAGS_CHUNK_SIZE = 5000
+
+# number of notes that are processed at once when blurring or unblurring images
+BLUR_IMAGES_CHUNK_SIZE = 1000
 
 
 def setup():
     add_compat_aliases()
 
     setup_menu(open_window)
+    setup_restore_snapshot_menu(restore_notetype_snapshot)
 
     card_layout_will_show.append(add_button_to_clayout)
 
     replace_default_addon_config_action()
 
     profile_did_open.append(on_profile_did_open)
+    profile_will_close.append(timing.end_session)
 
     browser_will_show_context_menu.append(on_browser_will_show_context_menu)
 
@@ -51,22 +54,54 @@ def setup():
 
 
 def on_profile_did_open():
-    copy_resources_into_media_folder()
+    timing.apply_config(mw.addonManager.getConfig(ADDON_DIR_NAME))
+
+    # The startup work is run when the main window is idle, so that it doesn't delay showing
+    # the main window. A timer with a delay of 0 ms fires once the pending events (like the
+    # ones for painting the main window) were processed. On startup the profile is opened
+    # before the event loop is started, so the timer can't fire before the main window was
+    # initialized and shown. The timer waits while a progress window is shown (e.g. when
+    # syncing on startup) and doesn't fire if the collection was closed in the meantime.
+    if hasattr(mw.progress, "single_shot"):
+        mw.progress.single_shot(0, run_startup_work)
+    else:  # < 2.1.50
+
+        def on_timer():
+            # the timer is parented to mw, so it would be kept until Anki is closed otherwise
+            timer.deleteLater()
+            run_startup_work()
+
+        timer = mw.progress.timer(0, on_timer, False)
+
+
+@timing.timed("startup")
+def run_startup_work():
+    sync_resources_into_media_folder()
 
     maybe_show_notetypes_update_notice()
 
 
 def open_window():
+    from .gui.config_window import NotetypesConfigWindow
+
     window = NotetypesConfigWindow()
     window.open()
 
 
+def restore_notetype_snapshot():
+    from .gui.extra_notetype_versions import restore_notetype_snapshot_with_ui
+
+    restore_notetype_snapshot_with_ui()
+
+
 def add_button_to_clayout(clayout):
     button = QPushButton()
     button.setAutoDefault(False)
     button.setText("Configure AnKing notetypes")
 
     def open_window_with_clayout():
+        from .gui.config_window import NotetypesConfigWindow
+
         window = NotetypesConfigWindow(clayout)
         window.open()
 
@@ -75,25 +110,45 @@ def add_button_to_clayout(clayout):
 
 
 def maybe_show_notetypes_update_notice():
+    """Checks for note type updates in the background and shows the update notice
+    if there are updates the user wasn't notified about yet."""
     # can happen when restoring data from backup
     if not mw.col:
         return
 
-    models_with_updates = models_with_available_updates()
-    if not models_with_updates:
-        return
-
-    # Return early if user was already notified about this version (and didn't choose "Remind me later")
-    latest_version = note_type_version(anking_notetype_models()[0])
     conf = mw.addonManager.getConfig(ADDON_DIR_NAME)
-    if latest_version == conf.get("latest_notified_note_type_version"):
-        return
 
+    @timing.timed("update_check")
+    def task() -> Optional[str]:
+        from .notetype_setting_definitions import anking_notetype_models
+        from .utils import models_with_available_updates, note_type_version
+
+        # Return early if user was already notified about this version (and didn't choose "Remind me later")
+        latest_version = note_type_version(anking_notetype_models()[0])
+        if latest_version == conf.get("latest_notified_note_type_version"):
+            return None
+
+        if not models_with_available_updates():
+            return None
+
+        return latest_version
+
+    def on_done(future: Future) -> None:
+        latest_version = future.result()
+        if latest_version is None or not mw.col:
+            return
+        show_notetypes_update_notice(latest_version)
+
+    mw.taskman.run_in_background(task, on_done)
+
+
+def show_notetypes_update_notice(latest_version: str) -> None:
+    conf = mw.addonManager.getConfig(ADDON_DIR_NAME)
     answer = askUserDialog(
         title="AnKing note types update",
         text="New versions of the AnKing note types are available! \nYou can choose to update them in the "
         "AnKing Note Types dialog. Open the dialog now?",
-        buttons=reversed(["Yes", "No", "Remind me later"]),
+        buttons=list(reversed(["Yes", "No", "Remind me later"])),
     ).run()
     if answer == "Yes":
         conf["latest_notified_note_type_version"] = latest_version
@@ -107,41 +162,72 @@ def maybe_show_notetypes_update_notice():
         pass
 
 
-def copy_resources_into_media_folder():
-    # add recources of all notetypes to collection media folder
-    for file in Path(RESOURCES_PATH).iterdir():
-        if not mw.col.media.have(file.name):
-            mw.col.media.add_file(str(file.absolute()))
-
-
 def replace_default_addon_config_action():
     mw.addonManager.setConfigAction(ADDON_DIR_NAME, open_window)
 
 
 def hint_fields_for_nids(nids: Sequence["NoteId"]) -> List[str]:
-    all_fields = mw.col.db.list(
-        "select distinct name from fields where ntid in (select distinct mid from notes where id in %s)"
-        % ids2str(nids)
-    )
-    hint_fields = []
-    for field in all_fields:
-        if field in HINT_BUTTONS.values():
-            hint_fields.append(field)
+    from .notetype_setting_definitions import HINT_BUTTONS
+    from .utils import field_names_by_mid, note_type_ids_for_nids
+
+    hint_button_names = set(HINT_BUTTONS.values())
+    field_names = field_names_by_mid()
+    hint_fields: List[str] = []
+    for mid in note_type_ids_for_nids(nids):
+        for field in field_names.get(mid, []):
+            if field in hint_button_names and field not in hint_fields:
+                hint_fields.append(field)
     return hint_fields
 
 
 def note_autoopen_fields(note: "Note") -> List[str]:
     tags = []
-    prefix = "autoopen::"
+    prefix = AUTOOPEN_TAG_PREFIX
     for tag in note.tags:
         if tag.startswith(prefix):
             tags.append(tag[tag.index(prefix) + len(prefix) :].replace("_", " "))
     return tags
 
 
+def set_autoopen_tags(
+    nids: Sequence["NoteId"],
+    autoopen_tags: List[str],
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> None:
+    """Replaces the autoopen tags of the notes with the given tags.
+    The tags are changed using bulk operations on chunks of notes, which are merged into one undo step.
+    on_progress is called with the number of processed notes after each chunk."""
+    old_tags = " ".join(
+        tag for tag in mw.col.tags.all() if tag.startswith(AUTOOPEN_TAG_PREFIX)
+    )
+    new_tags = " ".join(autoopen_tags)
+
+    # merging undo entries is not supported by old Anki versions
+    undo_entry = (
+        mw.col.add_custom_undo_entry("Auto-reveal Fields")
+        if hasattr(mw.col, "add_custom_undo_entry")
+        else None
+    )
+
+    for start in range(0, len(nids), AUTOOPEN_TAGS_CHUNK_SIZE):
+        chunk = nids[start : start + AUTOOPEN_TAGS_CHUNK_SIZE]
+        if old_tags:
+            mw.col.tags.bulk_remove(chunk, old_tags)
+        if new_tags:
+            mw.col.tags.bulk_add(chunk, new_tags)
+        # merged after each chunk, because the entry is dropped from the undo queue
+        # once there are more steps after it than Anki keeps
+        if undo_entry is not None:
+            mw.col.merge_undo_entries(undo_entry)
+        if on_progress:
+            on_progress(start + len(chunk))
+
+
 def on_auto_reveal_fields_action(
     browser: Browser, selected_nids: Sequence["NoteId"]
 ) -> None:
+    from .gui.utils import choose_subset
+
     fields = hint_fields_for_nids(selected_nids)
     if not fields:
         tooltip("No hint fields found in the selected notes.", parent=browser)
@@ -162,28 +248,124 @@ def on_auto_reveal_fields_action(
         return
     autoopen_tags = []
     for field in chosen:
-        autoopen_tags.append(f"autoopen::{field.lower().replace(' ', '_')}")
+        autoopen_tags.append(f"{AUTOOPEN_TAG_PREFIX}{field.lower().replace(' ', '_')}")
 
-    def task() -> None:
-        notes = []
-        for nid in selected_nids:
-            note = mw.col.get_note(nid)
-            notes.append(note)
-            new_tags = []
-            for tag in note.tags:
-                if not tag.startswith("autoopen::"):
-                    new_tags.append(tag)
-            new_tags.extend(autoopen_tags)
-            note.tags = new_tags
-            note.flush()
+    def on_progress(count: int) -> None:
+        mw.taskman.run_on_main(
+            lambda: mw.progress.update(
+                label=f"Updating notes... ({count}/{len(selected_nids)})",
+                value=count,
+                max=len(selected_nids),
+            )
+        )
 
     def on_done(fut: Future) -> None:
         mw.progress.finish()
+        if hasattr(mw, "update_undo_actions"):
+            mw.update_undo_actions()
         browser.onReset()
         fut.result()
 
     mw.progress.start(label="Updating notes...", immediate=True)
-    mw.taskman.run_in_background(task, on_done)
+    mw.taskman.run_in_background(
+        lambda: set_autoopen_tags(selected_nids, autoopen_tags, on_progress), on_done
+    )
+
+
+def set_images_blur_of_notes(
+    nids: Sequence["NoteId"],
+    blur: bool,
+    src_matches: Callable[[str], bool],
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Adds the blur class to or removes it from the images whose src src_matches in the notes.
+    The notes are processed in chunks and the changes are merged into one undo step.
+    on_progress is called with the number of processed notes after each chunk.
+    Returns the number of changed notes."""
+    from anki.utils import ids2str
+
+    from .image_blur import set_images_blur
+
+    # merging undo entries is not supported by old Anki versions
+    undo_entry = (
+        mw.col.add_custom_undo_entry("Blur/Unblur Images")
+        if hasattr(mw.col, "add_custom_undo_entry")
+        else None
+    )
+
+    changed_count = 0
+    for start in range(0, len(nids), BLUR_IMAGES_CHUNK_SIZE):
+        chunk = nids[start : start + BLUR_IMAGES_CHUNK_SIZE]
+        changed_notes = []
+        for nid in mw.col.db.list(
+            f"select id from notes where id in {ids2str(chunk)} and flds like '%<img%'"
+        ):
+            note = mw.col.get_note(nid)
+            fields = [
+                set_images_blur(field, blur, src_matches) for field in note.fields
+            ]
+            if fields != note.fields:
+                note.fields = fields
+                changed_notes.append(note)
+
+        if changed_notes and hasattr(mw.col, "update_notes"):
+            mw.col.update_notes(changed_notes)
+        else:
+            for note in changed_notes:
+                note.flush()
+
+        # merged after each chunk, see set_autoopen_tags
+        if undo_entry is not None:
+            mw.col.merge_undo_entries(undo_entry)
+        changed_count += len(changed_notes)
+        if on_progress:
+            on_progress(start + len(chunk))
+
+    return changed_count
+
+
+def on_blur_images_action(browser: Browser, selected_nids: Sequence["NoteId"]) -> None:
+    from .image_blur import filename_matcher
+
+    pattern, ok = getText(
+        "Only change images whose file name matches this pattern (e.g. *.png).<br>"
+        "Leave it empty to change all images of the selected notes.",
+        parent=browser,
+        title="Blur/Unblur Images",
+    )
+    if not ok:
+        return
+    answer = askUserDialog(
+        "Blur or unblur the images?",
+        buttons=["Blur", "Unblur", "Cancel"],
+        parent=browser,
+    ).run()
+    if answer not in ("Blur", "Unblur"):
+        return
+    blur = answer == "Blur"
+    src_matches = filename_matcher(pattern)
+
+    def on_progress(count: int) -> None:
+        mw.taskman.run_on_main(
+            lambda: mw.progress.update(
+                label=f"Updating notes... ({count}/{len(selected_nids)})",
+                value=count,
+                max=len(selected_nids),
+            )
+        )
+
+    def on_done(fut: Future) -> None:
+        mw.progress.finish()
+        if hasattr(mw, "update_undo_actions"):
+            mw.update_undo_actions()
+        browser.onReset()
+        tooltip(f"Updated {fut.result()} notes.", parent=browser)
+
+    mw.progress.start(label="Updating notes...", immediate=True)
+    mw.taskman.run_in_background(
+        lambda: set_images_blur_of_notes(selected_nids, blur, src_matches, on_progress),
+        on_done,
+    )
 
 
 def on_browser_will_show_context_menu(browser: Browser, context_menu: QMenu) -> None:
@@ -196,6 +378,14 @@ def on_browser_will_show_context_menu(browser: Browser, context_menu: QMenu) ->
     if not selected_nids:
         action.setDisabled(True)
 
+    blur_action = context_menu.addAction(
+        "AnKing Notetypes: Blur/Unblur images",
+        lambda: on_blur_images_action(browser, selected_nids),
+    )
+    context_menu.addAction(blur_action)
+    if not selected_nids:
+        blur_action.setDisabled(True)
+
 
 if mw is not None:
     setup()
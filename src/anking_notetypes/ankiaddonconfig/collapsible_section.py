@@ -15,8 +15,11 @@ from aqt.qt import (
 
 # https://stackoverflow.com/a/52617714
 class CollapsibleSection(QWidget):
-    def __init__(self, title="", parent=None):
+    def __init__(self, title="", parent=None, on_first_expand=None):
+        """on_first_expand is called before the section is expanded for the first time,
+        it can be used to add the content only when it's needed."""
         super(CollapsibleSection, self).__init__(parent)
+        self._on_first_expand = on_first_expand
 
         self.toggle_button = QToolButton(text=title, checkable=True, checked=False)
         self.toggle_button.setToolButtonStyle(
@@ -48,6 +51,11 @@ class CollapsibleSection(QWidget):
 
     @pyqtSlot()
     def on_pressed(self):
+        if self._on_first_expand is not None:
+            on_first_expand = self._on_first_expand
+            self._on_first_expand = None
+            on_first_expand()
+
         self.setContentLayout(self.content_area.layout())
 
         checked = self.toggle_button.isChecked()
@@ -1,7 +1,9 @@
 import copy
+import itertools
 import json
+from functools import lru_cache
 from sys import platform
-from typing import Any, Callable, Dict, Iterator, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from aqt import mw
 from aqt.qt import Qt
@@ -9,12 +11,67 @@ from aqt.qt import Qt
 from .window import ConfigWindow
 
 
+@lru_cache(maxsize=None)
+def _key_levels(key: str) -> Tuple[str, ...]:
+    return tuple(key.split("."))
+
+
+@lru_cache(maxsize=None)
+def _key_prefixes(key: str) -> Tuple[str, ...]:
+    "Returns the keys of the ancestors of the key, e.g. ('a', 'a.b') for 'a.b.c'."
+    levels = _key_levels(key)
+    return tuple(".".join(levels[:i]) for i in range(1, len(levels)))
+
+
+# marks keys that don't exist in the baseline or the current config
+_MISSING = object()
+
+
+def _is_nested(value: Any) -> bool:
+    "Returns whether changes inside of the value are reported as changes of its keys."
+    return value is _MISSING or (
+        isinstance(value, dict) and all("." not in k for k in value)
+    )
+
+
+def _changed_values(
+    key: str, old_value: Any, new_value: Any
+) -> Iterator[Tuple[str, Any, Any]]:
+    "Yields (key, old value, new value) for the values that differ inside of the values."
+    if old_value == new_value:
+        return
+    if _is_nested(old_value) and _is_nested(new_value):
+        old_dict = {} if old_value is _MISSING else old_value
+        new_dict = {} if new_value is _MISSING else new_value
+        if old_dict or new_dict:
+            for child in [*old_dict, *(k for k in new_dict if k not in old_dict)]:
+                yield from _changed_values(
+                    f"{key}.{child}",
+                    old_dict.get(child, _MISSING),
+                    new_dict.get(child, _MISSING),
+                )
+            return
+    yield (key, old_value, new_value)
+
+
 class ConfigManager:
     def __init__(self) -> None:
         self.config_window: Optional[ConfigWindow] = None
         self.window_open_hooks: List[Callable[[ConfigWindow], None]] = []
         self.change_hooks: List[Callable] = []
+        # hooks that are only called for changes of a key / of a key and its descendants
+        self._key_change_hooks: Dict[str, List[Callable]] = {}
+        self._prefix_change_hooks: Dict[str, List[Callable]] = {}
+        # registration order of the hooks, they are called in this order
+        self._change_hook_positions: Dict[Callable, int] = {}
+        self._change_hook_counter = itertools.count()
         self._config: Dict
+        # Values of keys from before their first change since the baseline was set, in the
+        # order in which they were recorded. Changes inside of lists are recorded as changes
+        # of the lists.
+        self._baseline: Dict[str, Any] = {}
+        # positions of the removed keys in their parent dicts
+        self._baseline_positions: Dict[str, int] = {}
         addon_dir = __name__.split(".", maxsplit=1)[0]
         self.addon_dir = addon_dir
         try:
@@ -26,62 +83,85 @@ class ConfigManager:
     def load(self) -> None:
         "Loads config from disk"
         self._config = mw.addonManager.getConfig(self.addon_dir)
+        self.set_baseline()
 
     def save(self) -> None:
         "Writes its config data to disk."
         mw.addonManager.writeConfig(self.addon_dir, self._config)
+        self.set_baseline()
 
     def to_json(self) -> str:
         return json.dumps(self._config)
 
     def get_from_dict(self, dict_obj: dict, key: str) -> Any:
         "Raises KeyError if config doesn't exist"
-        levels = key.split(".")
         return_val = dict_obj
-        for level in levels:
+        for level in _key_levels(key):
             if isinstance(return_val, list):
-                level = int(level)
-            return_val = return_val[level]
+                return_val = return_val[int(level)]
+            else:
+                return_val = return_val[level]
         return return_val
 
     def copy(self) -> Dict:
         return copy.deepcopy(self._config)
 
     def get(self, key: str, default: Any = None) -> Any:
-        "Returns default or None if config doesn't exist"
+        """Returns default or None if config doesn't exist.
+        Lists and dicts are returned without copying them. Changes made to them in place
+        are not tracked by changed_keys and restore_baseline, use set for changes instead."""
         try:
             return self.get_from_dict(self._config, key)
         except KeyError:
             return default
 
     def set(self, key: str, value: Any, on_change_trigger: bool = True) -> None:
-        levels = key.split(".")
+        levels = _key_levels(key)
+        # the key whose value is recorded as the baseline, if it was recorded already
+        recorded_key = None
         conf_obj = self._config
         for i in range(len(levels) - 1):
-            level = levels[i]
+            level: Any = levels[i]
             if isinstance(conf_obj, list):
+                if recorded_key is None:
+                    recorded_key = ".".join(levels[:i])
+                    self._record_list_baseline(recorded_key, conf_obj)
                 level = int(level)
             try:
                 conf_obj = conf_obj[level]
             except KeyError:
+                if recorded_key is None:
+                    recorded_key = ".".join(levels[: i + 1])
+                    self._record_baseline(recorded_key, _MISSING)
                 conf_obj[level] = {}
                 conf_obj = conf_obj[level]
         level = levels[-1]
         if isinstance(conf_obj, list):
+            if recorded_key is None:
+                self._record_list_baseline(".".join(levels[:-1]), conf_obj)
             level = int(level)
-
-        old_value = conf_obj.get(level, None)
+            old_value = conf_obj[level]
+        else:
+            old_value = conf_obj.get(level, _MISSING)
+            if recorded_key is None and key not in self._baseline:
+                self._record_baseline(key, old_value)
+            if old_value is _MISSING:
+                old_value = None
         conf_obj[level] = value
 
         if on_change_trigger and value != old_value:
-            for hook in self.change_hooks:
+            if self._key_change_hooks or self._prefix_change_hooks:
+                hooks = self._change_hooks_for(key)
+            else:
+                hooks = self.change_hooks
+            for hook in hooks:
                 hook(key, value)
 
     def pop(self, key: str) -> Any:
-        levels = key.split(".")
+        levels = _key_levels(key)
         conf_obj = self._config
         for i in range(len(levels) - 1):
-            level = levels[i]
+            level: Any = levels[i]
             if isinstance(conf_obj, list):
                 level = int(level)
             try:
@@ -89,10 +169,107 @@ class ConfigManager:
             except KeyError:
                 return None
         level = levels[-1]
-        if isinstance(conf_obj, list):
-            level = int(level)
+        list_key = self._outermost_list_key(key)
+        if list_key is not None:
+            self._record_list_baseline(
+                list_key, self.get_from_dict(self._config, list_key)
+            )
+            return conf_obj.pop(int(level))
+
+        if level in conf_obj:
+            self._record_baseline(key, conf_obj[level])
+            self._baseline_positions.setdefault(key, list(conf_obj).index(level))
         return conf_obj.pop(level)
 
+    # changes
+
+    def set_baseline(self) -> None:
+        "Makes the current config the baseline that changed_keys and diff compare against."
+        self._baseline = {}
+        self._baseline_positions = {}
+
+    def restore_baseline(self) -> None:
+        """Discards the changes made since the baseline was set, without reading the config from disk.
+        Change hooks are not called."""
+        for key, value in reversed(self._baseline.items()):
+            levels = _key_levels(key)
+            conf_obj = self._config
+            for level in levels[:-1]:
+                conf_obj = conf_obj[int(level) if isinstance(conf_obj, list) else level]
+            if value is _MISSING:
+                conf_obj.pop(levels[-1], None)
+            elif key not in self._baseline_positions:
+                conf_obj[levels[-1]] = value
+            else:
+                # removed keys are put back at their old positions, also if they were added again
+                conf_obj.pop(levels[-1], None)
+                items = list(conf_obj.items())
+                items.insert(self._baseline_positions[key], (levels[-1], value))
+                conf_obj.clear()
+                conf_obj.update(items)
+        self.set_baseline()
+
+    def changed_keys(self) -> List[str]:
+        """Returns the keys whose values differ from the baseline, including added and removed keys.
+        Changes inside of nested dicts are returned as the keys of the changed values, e.g. "a.b",
+        changes inside of lists as the keys of the lists."""
+        return list(self._changes())
+
+    def diff(self) -> Dict[str, Tuple[Any, Any]]:
+        """Returns a dict that maps the keys in changed_keys to (baseline value, current value).
+        The baseline value is None for added keys and the current value is None for removed keys.
+        """
+        return {
+            key: (
+                None if old_value is _MISSING else old_value,
+                None if new_value is _MISSING else new_value,
+            )
+            for key, (old_value, new_value) in self._changes().items()
+        }
+
+    def _changes(self) -> Dict[str, Tuple[Any, Any]]:
+        result: Dict[str, Tuple[Any, Any]] = {}
+        # values inside of a recorded key are compared with the value recorded first
+        compared_keys = set()
+        for key, old_value in self._baseline.items():
+            try:
+                new_value = self.get_from_dict(self._config, key)
+            except (KeyError, IndexError, TypeError, ValueError):
+                new_value = _MISSING
+            for changed_key, old, new in _changed_values(key, old_value, new_value):
+                if changed_key in compared_keys or any(
+                    prefix in compared_keys for prefix in _key_prefixes(changed_key)
+                ):
+                    continue
+                result[changed_key] = (old, new)
+            compared_keys.add(key)
+        return result
+
+    def _record_baseline(self, key: str, value: Any) -> None:
+        """Has to be called with the current value of the key before the key gets changed.
+        The value isn't copied, because set and pop replace values instead of changing them."""
+        # Keys inside of recorded values can be recorded too, the values recorded first take
+        # precedence in restore_baseline and _changes.
+        if key not in self._baseline:
+            self._baseline[key] = value
+
+    def _record_list_baseline(self, key: str, value: List) -> None:
+        "Has to be called before a list gets changed in place."
+        if key not in self._baseline:
+            self._baseline[key] = copy.deepcopy(value)
+
+    def _outermost_list_key(self, key: str) -> Optional[str]:
+        "Returns the key of the outermost list that contains the key, if there is one."
+        conf_obj: Any = self._config
+        levels = _key_levels(key)
+        for i, level in enumerate(levels[:-1]):
+            if isinstance(conf_obj, list):
+                return ".".join(levels[:i])
+            conf_obj = conf_obj.get(level) if isinstance(conf_obj, dict) else None
+        if isinstance(conf_obj, list):
+            return ".".join(levels[:-1])
+        return None
+
     def __getitem__(self, key: str) -> Any:
         return self.get(key)
 
@@ -140,8 +317,49 @@ class ConfigManager:
 
     add_config_tab = on_window_open
 
-    def on_change(self, fn: Callable[[str, Any], None]) -> None:
-        self.change_hooks.append(fn)
+    def on_change(
+        self,
+        fn: Callable[[str, Any], None],
+        key: Optional[str] = None,
+        prefix: Optional[str] = None,
+    ) -> None:
+        """Registers fn to be called with (key, value) when a value is changed using set.
+        If key is given, fn is only called for changes of this key. If prefix is given,
+        fn is only called for changes of this key and its descendants.
+        The hooks of a change are called in the order in which they were registered."""
+        self._change_hook_positions[fn] = next(self._change_hook_counter)
+        if key is not None:
+            self._key_change_hooks.setdefault(key, []).append(fn)
+        elif prefix is not None:
+            self._prefix_change_hooks.setdefault(prefix, []).append(fn)
+        else:
+            self.change_hooks.append(fn)
 
     def remove_on_change_hook(self, fn: Callable[[str, Any], None]) -> None:
-        self.change_hooks.remove(fn)
+        "Removes fn, no matter whether it was registered for all changes, a key or a prefix."
+        removed = False
+        for hooks in [
+            self.change_hooks,
+            *self._key_change_hooks.values(),
+            *self._prefix_change_hooks.values(),
+        ]:
+            if fn in hooks:
+                hooks.remove(fn)
+                removed = True
+        if not removed:
+            raise ValueError(f"{fn} is not a registered change hook")
+        self._change_hook_positions.pop(fn, None)
+
+    def _change_hooks_for(self, key: str) -> List[Callable]:
+        indexed_hooks = list(self._key_change_hooks.get(key, ()))
+        if self._prefix_change_hooks:
+            for prefix in (*_key_prefixes(key), key):
+                indexed_hooks.extend(self._prefix_change_hooks.get(prefix, ()))
+        if not indexed_hooks:
+            return self.change_hooks
+
+        # hooks that were added to change_hooks directly are called first
+        return sorted(
+            [*self.change_hooks, *indexed_hooks],
+            key=lambda fn: self._change_hook_positions.get(fn, -1),
+        )
@@ -126,7 +126,9 @@ class ConfigWindow(QDialog):
         # and also in case the window was clicked without clicking any of the buttons
         for hook in self._on_close_hook:
             hook()
-        self.conf.load()
+        # the config is only changed in memory until it's saved,
+        # so it doesn't have to be read from disk again
+        self.conf.restore_baseline()
         saveGeom(self, self.geom_key)
         evt.accept()
 
@@ -730,9 +732,27 @@ class ConfigLayout(QBoxLayout):
             Qt.ScrollBarPolicy.ScrollBarAsNeeded,
         )
 
-    def collapsible_section(self, title: str) -> "ConfigLayout":
+    def collapsible_section(
+        self, title: str, builder: Optional[Callable[["ConfigLayout"], None]] = None
+    ) -> "ConfigLayout":
+        """Adds a collapsed section and returns its layout.
+        If builder is given, it's called with the layout when the section is expanded for the first time,
+        so that the widgets of sections that are never expanded don't have to be created."""
         layout = ConfigLayout(self.config_window, QBoxLayout.Direction.TopToBottom)
-        section = CollapsibleSection(title)
+
+        def build() -> None:
+            # the widgets are created after the window was opened, so they have to be updated here
+            widget_updates_count = len(self.widget_updates)
+            builder(layout)
+            for widget_update in self.widget_updates[widget_updates_count:]:
+                try:
+                    widget_update()
+                except InvalidConfigValueError:
+                    pass
+
+        section = CollapsibleSection(
+            title, on_first_expand=build if builder is not None else None
+        )
         section.setContentLayout(layout)
         self.addWidget(section)
         return layout
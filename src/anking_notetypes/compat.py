@@ -1,5 +1,6 @@
 from anki.models import ModelManager
 from anki.collection import Collection
+from anki.tags import TagManager
 
 
 def add_compat_aliases():
@@ -7,6 +8,8 @@ def add_compat_aliases():
     add_compat_alias(ModelManager, "add_dict", "add")
     add_compat_alias(ModelManager, "update_dict", "save")
     add_compat_alias(Collection, "get_note", "getNote")
+    add_compat_alias(TagManager, "bulk_add", "bulkAdd")
+    add_compat_alias(TagManager, "bulk_remove", "bulkRem")
 
 
 def add_compat_alias(namespace, new_name, old_name):
@@ -1,5 +1,8 @@
 import re
+from pathlib import Path
 
+# files in this folder are kept by Anki when the add-on is updated
+USER_FILES_PATH = Path(__file__).parent / "user_files"
 
 NOTETYPE_COPY_RE = r"{notetype_base_name}-[a-zA-Z0-9]{{5}}"
 ANKIHUB_NOTETYPE_RE = r"{notetype_base_name} \(.+ / .+?\)"
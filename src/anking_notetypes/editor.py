@@ -1,8 +1,10 @@
 import json
 import re
+import weakref
+from functools import lru_cache
 from os.path import dirname, realpath
 from pathlib import Path
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 from aqt import mw
 from aqt.editor import Editor, EditorWebView
@@ -18,25 +20,66 @@ from aqt.gui_hooks import (
 )
 from aqt.qt import QAction, QKeySequence, QMenu, QUrl, qconnect, qtmajor
 from aqt.utils import shortcut, showInfo
-from bs4 import BeautifulSoup
 
-from .notetype_setting_definitions import is_io_note_type
+from .image_blur import toggle_image_blur
 
 occlude_shortcut = "Ctrl+Shift+O"
 occlusion_behavior = "autopaste"
 
 
-def get_base_top(editor, prefix: str, suffix: str) -> int:
-    matches = []
-    query = re.escape(prefix) + r"(\d+)" + re.escape(suffix)
+# code 0 field is optional
+trailing_number = re.compile(r"[123456789]\d*$")
+
+
+class FieldIndexMap(NamedTuple):
+    # positions of the fields that have a numeric suffix in their name, keyed by the suffix
+    positions_by_suffix: Dict[int, List[int]]
+    # highest code field number of the contiguous sequence of code fields starting at 1
+    max_code_field: int
+
+
+# FieldIndexMaps keyed by (note type id, note type modification time)
+_field_index_maps: Dict[Tuple[int, int], FieldIndexMap] = dict()
+
+
+def field_index_map(editor) -> FieldIndexMap:
+    "Returns the FieldIndexMap of the note type of the editor's note, it is built once per note type version."
+    model = editor.note.note_type()
+    key = (model["id"], model["mod"])
+    if (result := _field_index_maps.get(key)) is None:
+        result = _build_field_index_map([field["name"] for field in model["flds"]])
+        _field_index_maps[key] = result
+    return result
 
-    for _name, item in editor.note.items():
-        matches.extend(re.findall(query, item))
 
-    values = [0]
-    values.extend([int(x) for x in matches])
+def _build_field_index_map(field_names: List[str]) -> FieldIndexMap:
+    positions_by_suffix: Dict[int, List[int]] = dict()
+    code_fields = set()
+    for position, name in enumerate(field_names):
+        if match := re.search(r"\d+$", name):
+            positions_by_suffix.setdefault(int(match[0]), []).append(position)
+        if match := trailing_number.search(name):
+            code_fields.add(int(match[0]))
 
-    return max(values)
+    max_code_field = 0
+    # probably skipped an index if the next number is missing
+    while max_code_field + 1 in code_fields:
+        max_code_field += 1
+
+    return FieldIndexMap(positions_by_suffix, max_code_field)
+
+
+@lru_cache(maxsize=None)
+def _index_pattern(prefix: str, suffix: str) -> re.Pattern:
+    return re.compile(re.escape(prefix) + r"(\d+)" + re.escape(suffix))
+
+
+def get_base_top(editor, prefix: str, suffix: str) -> int:
+    # the field separator can't be part of the prefix or suffix, so matches can't span fields
+    text = "\x1f".join(editor.note.fields)
+    return max(
+        (int(x) for x in _index_pattern(prefix, suffix).findall(text)), default=0
+    )
 
 
 def get_top_index(editor, prefix: str, suffix: str) -> int:
@@ -102,47 +145,81 @@ def make_insertion_js(field_index: int, text: str) -> str:
 
 
 def insert_into_zero_indexed(editor, text: str) -> None:
-    for index, (name, _item) in enumerate(editor.note.items()):
-        match = re.search(r"\d+$", name)
-
-        if not match or int(match[0]) != 0:
-            continue
+    positions = field_index_map(editor).positions_by_suffix.get(0)
+    if not positions:
+        return
 
-        editor.web.eval(f"EditorIO.insertIntoZeroIndexed(`{text}`, {index}); ")
-        break
+    editor.web.eval(f"EditorIO.insertIntoZeroIndexed(`{text}`, {positions[0]}); ")
 
 
 def activate_matching_fields(editor, indices: List[int]) -> List[bool]:
-    founds = [False for index in indices]
+    """Fills the empty fields whose numeric suffix is in indices with "active".
+    Returns whether a matching field was found for each index.
+    The insertions are sent to the webview in a single eval."""
+    positions_by_suffix = field_index_map(editor).positions_by_suffix
+    fields = editor.note.fields
 
-    for index, (name, item) in enumerate(editor.note.items()):
-        match = re.search(r"\d+$", name)
+    insertion_js = []
+    for position in sorted(
+        position
+        for index in set(indices)
+        for position in positions_by_suffix.get(index, [])
+    ):
+        if is_text_empty(editor, fields[position]):
+            insertion_js.append(make_insertion_js(position, "active"))
 
-        if not match:
-            continue
+    if insertion_js:
+        editor.web.eval("".join(insertion_js))
 
-        matched = int(match[0])
+    return [index in positions_by_suffix for index in indices]
 
-        if matched not in indices:
-            continue
 
-        founds[indices.index(matched)] = True
+# Editors into which web/editor.js and web/editor.css were loaded. They are loaded when
+# the first note of an image occlusion note type is loaded into an editor.
+_editors_with_io_code: "weakref.WeakSet[Editor]" = weakref.WeakSet()
 
-        if not is_text_empty(editor, item):
-            continue
 
-        editor.web.eval(make_insertion_js(index, "active"))
+def include_closet_code(webcontent, context) -> None:
+    # The code is loaded by load_closet_code_js when it's needed. The content of the editor
+    # is replaced, so it has to be loaded again.
+    if isinstance(context, Editor):
+        _editors_with_io_code.discard(context)
 
-    return founds
 
+def load_closet_code_js() -> str:
+    """Returns JavaScript that loads the editor code and styling and evaluates to a promise.
+    The promise is kept as globalThis.ankingIOLoaded, code that uses EditorIO before it resolved
+    has to wait for it."""
+    addon_package = mw.addonManager.addonFromModule(__name__)
+    css_path = json.dumps(f"/_addons/{addon_package}/web/editor.css")
+    js_path = json.dumps(f"/_addons/{addon_package}/web/editor.js")
+    return (
+        "(globalThis.ankingIOLoaded = new Promise((resolve) => { "
+        'const link = document.createElement("link"); '
+        'link.rel = "stylesheet"; '
+        f"link.href = {css_path}; "
+        "document.head.appendChild(link); "
+        'const script = document.createElement("script"); '
+        f"script.src = {js_path}; "
+        # fields of the previous notes are reused, they are styled before the note is loaded
+        "script.onload = () => { EditorIO.addOcclusionStyleToMountedFields(); resolve(); }; "
+        # the note should be loaded even if the code couldn't be loaded
+        "script.onerror = resolve; "
+        "document.head.appendChild(script); "
+        "}))"
+    )
 
-def include_closet_code(webcontent, context) -> None:
-    if not isinstance(context, Editor):
-        return
 
-    addon_package = mw.addonManager.addonFromModule(__name__)
-    webcontent.css.append(f"/_addons/{addon_package}/web/editor.css")
-    webcontent.js.append(f"/_addons/{addon_package}/web/editor.js")
+@lru_cache(maxsize=None)
+def is_io_note_type_name(model_name: str) -> bool:
+    # all image occlusion note types have "IO" in their name, checking this first
+    # avoids importing the setting definitions for other note types
+    if "IO" not in model_name:
+        return False
+
+    from .notetype_setting_definitions import is_io_note_type
+
+    return is_io_note_type(model_name)
 
 
 def process_occlusion_index_text(index_text: str) -> List[int]:
@@ -203,28 +280,11 @@ def add_occlusion_messages(
     return handled
 
 
-# code 0 field is optional
-trailing_number = re.compile(r"[123456789]\d*$")
-
-
 def get_max_code_field(editor) -> int:
-    number_suffixes = map(
-        lambda item: trailing_number.search(item[0]), editor.note.items()
-    )
-    indices = [suffix[0] for suffix in number_suffixes if suffix]
-    sorted_indices = sorted(set([int(index) for index in indices]))
-
-    max = 0
-    for index, value in enumerate(sorted_indices):
-        # probably skipped an index
-        if value != index + 1:
-            break
-
-        max = value
-
-    return max
+    return field_index_map(editor).max_code_field
 
 
+@lru_cache(maxsize=None)
 def anking_io_js_filename() -> Optional[str]:
     path = next((Path(__file__).parent / "resources").glob("__ankingio-*.js"), None)
     if not path:
@@ -235,9 +295,11 @@ def anking_io_js_filename() -> Optional[str]:
 def toggle_occlusion_mode(editor):
     model = editor.note.note_type()
 
-    if not is_io_note_type(model["name"]):
+    if not is_io_note_type_name(model["name"]):
         showInfo("Please choose an AnKing image occlusion note type")
-        editor.web.eval("EditorIO.setInactive()")
+        if editor in _editors_with_io_code:
+            # the code may still be loading
+            editor.web.eval("globalThis.EditorIO && EditorIO.setInactive()")
         return
 
     addon_package = mw.addonManager.addonFromModule(__name__)
@@ -292,16 +354,28 @@ occlusion_container_pattern = re.compile(
 
 
 def remove_occlusion_code(txt: str, _editor) -> str:
-    if match := re.search(occlusion_container_pattern, txt):
-        rawImage = match[1]
+    # this runs on every field save, so fields without occlusion containers are returned
+    # without running the regex
+    if 'class="anking-occlusion-container"' not in txt:
+        return txt
+
+    return occlusion_container_pattern.sub(r"\1", txt)
 
-        return re.sub(occlusion_container_pattern, rawImage, txt)
 
-    return txt
+def clear_occlusion_mode(js, note, editor):
+    if editor in _editors_with_io_code:
+        # the code may still be loading, EditorIO is undefined if it couldn't be loaded
+        return (
+            "(globalThis.ankingIOLoaded ?? Promise.resolve())"
+            ".then(() => globalThis.EditorIO && EditorIO.clearOcclusionMode())"
+            f".then(() => {{ {js} }}); "
+        )
 
+    if not is_io_note_type_name(note.note_type()["name"]):
+        return js
 
-def clear_occlusion_mode(js, _note, _editor):
-    return f"EditorIO.clearOcclusionMode().then(() => {{ {js} }}); "
+    _editors_with_io_code.add(editor)
+    return f"{load_closet_code_js()}.then(() => {{ {js} }}); "
 
 
 def refocus(editor):
@@ -310,7 +384,11 @@ def refocus(editor):
 
 
 def maybe_refocus(editor):
-    editor.web.eval("EditorIO.maybeRefocus(); ")
+    if editor not in _editors_with_io_code:
+        return
+
+    # the code may still be loading
+    editor.web.eval("globalThis.EditorIO && EditorIO.maybeRefocus(); ")
 
 
 def on_editor_will_show_context_menu(webview: EditorWebView, menu: QMenu) -> None:
@@ -322,20 +400,7 @@ def on_editor_will_show_context_menu(webview: EditorWebView, menu: QMenu) -> Non
         else:
             src = url.toString()
         field = editor.note.fields[editor.currentField]
-        soup = BeautifulSoup(field, "html.parser")
-        for img in soup("img"):
-            if img.get("src", "").strip("/") != src:
-                continue
-            classes = img.get("class", [])
-            if "blur" in classes:
-                classes.remove("blur")
-            else:
-                classes.append("blur")
-            if classes:
-                img["class"] = classes
-            elif "class" in img.attrs:
-                del img["class"]
-        editor.note.fields[editor.currentField] = soup.decode_contents()
+        editor.note.fields[editor.currentField] = toggle_image_blur(field, src)
         editor.loadNoteKeepingFocus()
 
     if qtmajor >= 6:
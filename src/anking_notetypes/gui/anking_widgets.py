@@ -17,6 +17,8 @@ from aqt.qt import (
 )
 from aqt.utils import openLink
 
+# the optimized variants of the images are preferred, search paths are tried in the order they were added
+QDir.addSearchPath("icons", f"{Path(__file__).parent.parent}/resources/optimized")
 QDir.addSearchPath("icons", f"{Path(__file__).parent.parent}/resources")
 
 
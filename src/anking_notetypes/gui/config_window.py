@@ -1,20 +1,16 @@
-import re
 from collections import defaultdict
 from concurrent.futures import Future
-from typing import Any, Dict, List, Optional, Union
+from functools import partial
+from typing import Any, Dict, List, Optional, Set, Union
 
 from aqt import mw
 from aqt.clayout import CardLayout
-from aqt.qt import QHBoxLayout, QLabel, QWidget
+from aqt.qt import QCheckBox, QFontDatabase, QHBoxLayout, QLabel, QWidget
 from aqt.utils import askUser, showInfo, tooltip
 
 from ..ankiaddonconfig import ConfigManager, ConfigWindow
 from ..ankiaddonconfig.window import ConfigLayout
-from ..notetype_renames import (
-    canonical_notetype_name,
-    legacy_notetype_names,
-    matching_notetype_names,
-)
+from ..notetype_renames import canonical_notetype_name, legacy_notetype_names
 from ..notetype_setting import NotetypeSetting, NotetypeSettingException
 from ..notetype_setting_definitions import (
     anking_notetype_model,
@@ -22,12 +18,26 @@ from ..notetype_setting_definitions import (
     configurable_fields_for_notetype,
     general_settings,
     general_settings_defaults_dict,
-    is_ankihub_notetype_version,
-    is_notetype_copy,
     notetype_base_name,
     setting_configs,
 )
-from ..utils import update_notetype_to_newest_version
+from ..timing import (
+    TIMING_CONFIG_KEY,
+    TIMING_ENV_VAR,
+    apply_config,
+    format_stats,
+    is_enabled,
+    is_enabled_by_env,
+    last_session_stats,
+    session_stats,
+    timed,
+    timer,
+)
+from ..utils import (
+    models_with_available_updates,
+    note_type_versions,
+    update_notetype_to_newest_version,
+)
 from .anking_widgets import AnkingIconsLayout, GithubLinkLayout
 from .extra_notetype_versions import handle_extra_notetype_versions
 
@@ -68,6 +78,8 @@ class NotetypesConfigWindow:
 
         self.conf = None
         self.last_general_ntss: Union[List[NotetypeSetting], None] = None
+        # ids of the note type versions whose settings were read into the config
+        self._read_in_model_ids: Set[int] = set()
 
     def open(self):
         handle_extra_notetype_versions()
@@ -95,6 +107,8 @@ class NotetypesConfigWindow:
         self.conf = ConfigManager()
 
         self._read_in_settings()
+        # only settings that are changed after this need to be written to the note types
+        self.conf.set_baseline()
 
         # add general tab
         self.conf.add_config_tab(lambda window: self._add_general_tab(window))
@@ -123,25 +137,28 @@ class NotetypesConfigWindow:
                 )
             )
 
+        # add diagnostics tab
+        self.conf.add_config_tab(lambda window: self._add_diagnostics_tab(window))
+
         # setup live update of clayout model on changes
         def live_update_clayout_model(key: str, _: Any):
-            notetype_base_name_from_setting, setting_name = key.split(".")
+            _, setting_name = key.split(".")
             model = self.clayout.model
-            notetype_base_name_from_model = notetype_base_name(model["name"])
-            if notetype_base_name_from_setting != notetype_base_name_from_model:
-                return
-
             nts = NotetypeSetting.from_config(setting_configs[setting_name])
             self._safe_update_model_settings(
                 model=model,
-                nt_base_name=notetype_base_name_from_model,
+                nt_base_name=notetype_base_name(model["name"]),
                 ntss=[nts],
             )
 
             self._update_clayout_model(model)
 
         if self.clayout:
-            self.conf.on_change(live_update_clayout_model)
+            # only changes of the settings of the note type of the clayout model are relevant
+            self.conf.on_change(
+                live_update_clayout_model,
+                prefix=notetype_base_name(self.clayout.model["name"]),
+            )
 
         # change window settings, overwrite on_save, setup notetype updates
         self.conf.on_window_open(self._setup_window_settings)
@@ -166,6 +183,14 @@ class NotetypesConfigWindow:
         window.save_btn.clicked.disconnect()  # type: ignore
         window.save_btn.clicked.connect(lambda: on_save(window))  # type: ignore
 
+        # the window references the config and the note types of the session,
+        # they shouldn't be kept in memory until the next window is opened
+        def on_close():
+            if self.__class__.window is window:
+                self.__class__.window = None
+
+        window.execute_on_close(on_close)
+
         if self.clayout:
             self._set_active_tab(notetype_base_name(self.clayout.model["name"]))
 
@@ -200,6 +225,7 @@ class NotetypesConfigWindow:
         window.main_layout.addSpacing(10)
 
     # tabs and NotetypeSettings (ntss)
+    @timed("tab_construction")
     def _add_notetype_settings_tab(
         self,
         nt_base_name: str,
@@ -240,6 +266,7 @@ class NotetypesConfigWindow:
                 on_click=lambda: self._import_notetype_and_reload_tab(nt_base_name),
             )
 
+    @timed("tab_construction")
     def _add_general_tab(self, window: ConfigWindow):
         tab = window.add_tab("General", index=0)
 
@@ -279,6 +306,53 @@ class NotetypesConfigWindow:
         else:
             update_btn.setDisabled(True)
 
+    def _add_diagnostics_tab(self, window: ConfigWindow):
+        tab = window.add_tab("Diagnostics")
+
+        tab.text(
+            "Records how long the add-on takes for loading the note types, parsing and "
+            "changing their settings and building this window. The timings of each session "
+            "are written to the log in the user_files folder of the add-on when the profile is closed.",
+            multiline=True,
+        )
+        tab.space(10)
+
+        # the setting is stored in the add-on config, not in self.conf, which is only
+        # used for the note type settings
+        checkbox = QCheckBox("Record timings")
+        checkbox.setChecked(is_enabled())
+        if is_enabled_by_env():
+            checkbox.setDisabled(True)
+            checkbox.setToolTip(f"Enabled by the {TIMING_ENV_VAR} environment variable")
+
+        def on_toggled(checked: bool) -> None:
+            config = mw.addonManager.getConfig(__name__)
+            config[TIMING_CONFIG_KEY] = checked
+            mw.addonManager.writeConfig(__name__, config)
+            apply_config(config)
+
+        checkbox.toggled.connect(on_toggled)  # type: ignore
+        tab.addWidget(checkbox)
+        tab.space(10)
+
+        stats_label = tab.text("", multiline=True)
+        stats_label.setFont(
+            QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont)
+        )
+
+        def update_stats() -> None:
+            last_stats = last_session_stats()
+            stats_label.setText(
+                "Current session\n"
+                f"{format_stats(session_stats())}\n\n"
+                "Last session\n"
+                f"{format_stats(last_stats) if last_stats else 'No timings recorded yet.'}"
+            )
+
+        update_stats()
+        tab.stretch()
+        tab.button("Refresh", on_click=update_stats)
+
     def _add_nts_widgets_to_layout(
         self,
         layout: ConfigLayout,
@@ -300,8 +374,10 @@ class NotetypesConfigWindow:
             section_to_ntss[section].append(nts)
 
         nt_base_name = notetype_base_name(model["name"]) if model else None
-        for section_name, section_ntss in sorted(section_to_ntss.items()):
-            section = layout.collapsible_section(section_name)
+
+        def add_section_widgets(
+            section: ConfigLayout, section_ntss: List[NotetypeSetting]
+        ) -> None:
             for nts in section_ntss:
                 if general:
                     nts.add_widget_to_general_config_layout(section)
@@ -310,6 +386,13 @@ class NotetypesConfigWindow:
                         section, notetype_base_name=nt_base_name, model=model
                     )
                 section.space(7)
+
+        for section_name, section_ntss in sorted(section_to_ntss.items()):
+            # the widgets of a section are only created when it gets expanded
+            layout.collapsible_section(
+                section_name,
+                builder=partial(add_section_widgets, section_ntss=section_ntss),
+            )
             layout.hseparator()
             layout.space(10)
 
@@ -396,9 +479,10 @@ class NotetypesConfigWindow:
             return
 
         nt_base_name = notetype_base_name(model["name"])
-        for model_version in _note_type_versions(nt_base_name):
+        for model_version in note_type_versions(nt_base_name):
             update_notetype_to_newest_version(model_version, nt_base_name)
-            mw.col.models.update_dict(model_version)  # type: ignore
+            with timer("db_writes"):
+                mw.col.models.update_dict(model_version)  # type: ignore
 
         if self.clayout:
             self._update_clayout_model(model)
@@ -453,7 +537,8 @@ class NotetypesConfigWindow:
                 )
 
                 # update the model in the database
-                mw.col.models.update_dict(model)
+                with timer("db_writes"):
+                    mw.col.models.update_dict(model)
 
             return to_be_updated
 
@@ -490,7 +575,8 @@ class NotetypesConfigWindow:
     def _import_notetype(self, nt_base_name: str) -> None:
         model = anking_notetype_model(nt_base_name)
         model["id"] = 0
-        mw.col.models.add_dict(model)  # type: ignore
+        with timer("db_writes"):
+            mw.col.models.add_dict(model)  # type: ignore
 
     # read / write notetype settings
     # changes to settings will be written to mw.col.models when the Save button is pressed
@@ -503,6 +589,7 @@ class NotetypesConfigWindow:
 
     def _read_in_settings_from_notetypes(self):
         error_msg = ""
+        self._read_in_model_ids = set()
         for nt_base_name in anking_notetype_names():
             if self.clayout and nt_base_name == notetype_base_name(
                 self.clayout.model["name"]
@@ -514,6 +601,7 @@ class NotetypesConfigWindow:
 
             if not model:
                 continue
+            self._read_in_model_ids.add(model["id"])
             for nts in ntss_for_model(model):
                 try:
                     self.conf[nts.key(nt_base_name)] = nts.setting_value(model)
@@ -583,15 +671,45 @@ class NotetypesConfigWindow:
         return True
 
     def _apply_setting_changes_for_all_notetypes(self):
+        # Changed settings are applied to all versions of the note types. The other settings
+        # are only applied to versions whose values differ from the config, e.g. copies of a
+        # note type that were changed separately, so that all versions are in sync after saving.
+        changed_setting_names: Dict[str, Set[str]] = defaultdict(set)
+        for key in self.conf.changed_keys():
+            nt_base_name, setting_name = key.split(".")[:2]
+            changed_setting_names[nt_base_name].add(setting_name)
+
         for nt_base_name in anking_notetype_names():
-            for model in _note_type_versions(nt_base_name):
+            for model in note_type_versions(nt_base_name):
                 if not model:
                     continue
-                ntss = ntss_for_model(model)
+                if model["id"] in self._read_in_model_ids:
+                    # the config was read from this version, only the changed settings differ
+                    if nt_base_name not in changed_setting_names:
+                        continue
+                    ntss = [
+                        nts
+                        for nts in ntss_for_model(model)
+                        if nts.name() in changed_setting_names[nt_base_name]
+                    ]
+                else:
+                    ntss = [
+                        nts
+                        for nts in ntss_for_model(model)
+                        if nts.name() in changed_setting_names[nt_base_name]
+                        or not _setting_has_value(
+                            model, nts, self.conf.get(nts.key(nt_base_name))
+                        )
+                    ]
+                if not ntss:
+                    continue
                 self._safe_update_model_settings(
                     model=model, nt_base_name=nt_base_name, ntss=ntss
                 )
-                mw.col.models.update_dict(model)
+                with timer("db_writes"):
+                    mw.col.models.update_dict(model)
+
+        self.conf.set_baseline()
 
     # clayout
     def _update_clayout_model(self, model):
@@ -607,52 +725,11 @@ class NotetypesConfigWindow:
         scroll_bar.setValue(min(scroll_pos, scroll_bar.maximum()))
 
 
-def note_type_version(model: "NotetypeDict") -> Optional[str]:
-    """Returns the version of the model or None if it is not specified.
-    The version is specified on the top of the front template of the model."""
-    front = model["tmpls"][0]["qfmt"]
-    m = re.match(r"<!-- version ([\w\d]+) -->\n", front)
-    if not m:
-        return None
-    return m.group(1)
-
-
-def models_with_available_updates() -> List["NotetypeDict"]:
-    return [
-        model
-        for notetype_base_name in anking_notetype_names()
-        for model in _note_type_versions(notetype_base_name)
-        if _new_version_available_for_model(model)
-    ]
-
-
-def _new_version_available_for_model(model: "NotetypeDict") -> bool:
-    current_version = note_type_version(model)
-    base_name = notetype_base_name(model["name"])
-    newest_version = note_type_version(anking_notetype_model(base_name))
-    return current_version != newest_version
-
-
-def _note_type_versions(nt_base_name: str) -> List["NotetypeDict"]:
-    """Returns a list of all notetype versions of the notetype in the collection.
-    Version of a note type are created by the AnkiHub add-on and by copying
-    the base AnKing note types or importing them from different sources."""
-    matching_names = matching_notetype_names(canonical_notetype_name(nt_base_name))
-    models = [
-        mw.col.models.get(x.id)  # type: ignore
-        for x in mw.col.models.all_names_and_ids()
-        for matching_name in matching_names
-        if _matches_notetype_version(x.name, matching_name)
-    ]
-    return models
-
-
-def _matches_notetype_version(model_name: str, base_name: str) -> bool:
-    return (
-        model_name == base_name
-        or is_ankihub_notetype_version(model_name, base_name)
-        or is_notetype_copy(model_name, base_name)
-    )
+def _setting_has_value(model: "NotetypeDict", nts: NotetypeSetting, value: Any) -> bool:
+    try:
+        return nts.setting_value(model) == value
+    except NotetypeSettingException:
+        return False
 
 
 def _most_basic_notetype_version(nt_base_name: str) -> Optional["NotetypeDict"]:
@@ -664,7 +741,7 @@ def _most_basic_notetype_version(nt_base_name: str) -> Optional["NotetypeDict"]:
     on name length alone.
     """
     canonical = canonical_notetype_name(nt_base_name)
-    model_versions = _note_type_versions(nt_base_name)
+    model_versions = note_type_versions(nt_base_name)
     versions_by_name = {model["name"]: model for model in model_versions}
 
     for preferred in [canonical, *legacy_notetype_names(canonical)]:
@@ -684,5 +761,5 @@ def _names_of_all_supported_note_types() -> List[str]:
     return [
         version["name"]
         for notetype_base_name in anking_notetype_names()
-        for version in _note_type_versions(notetype_base_name)
+        for version in note_type_versions(notetype_base_name)
     ]
@@ -1,44 +1,54 @@
+import re
+from collections import defaultdict
 from concurrent.futures import Future
 from copy import deepcopy
-from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
 
 from aqt import mw
-from aqt.utils import askUser, tooltip
+from aqt.utils import askUser, getFile, showInfo, tooltip
 
+from ..constants import NOTETYPE_COPY_RE
 from ..notetype_renames import legacy_notetype_names, matching_notetype_names
-from ..notetype_setting_definitions import anking_notetype_names, is_notetype_copy
-from ..utils import adjust_fields, create_backup
+from ..notetype_setting_definitions import anking_notetype_names
+from ..notetype_snapshot import (
+    SNAPSHOTS_PATH,
+    create_notetype_snapshot,
+    notetype_snapshot_paths,
+    recent_backup_exists,
+    restore_notetype_snapshot,
+)
+from ..utils import (
+    adjust_fields,
+    create_backup,
+    invalidate_notetypes_state_key,
+    notetypes_state_key,
+)
 
 if TYPE_CHECKING:
     from anki.models import NotetypeDict
 
 
-def handle_extra_notetype_versions() -> None:
+class ExtraNotetypeVersions(NamedTuple):
     # mids of copies of the AnKing notetype, keyed by canonical base name
-    copy_mids_by_notetype_base_name: Dict[str, List[int]] = dict()
+    copy_mids_by_notetype_base_name: Dict[str, List[int]]
     # (legacy_name, canonical_name) pairs for mains that will be renamed during conversion
-    legacy_mains_to_rename: List[Tuple[str, str]] = []
-    all_models = list(mw.col.models.all_names_and_ids())
-    for notetype_base_name in anking_notetype_names():
-        matching_names = matching_notetype_names(notetype_base_name)
-        if _first_existing_notetype_name(matching_names) is None:
-            continue
+    legacy_mains_to_rename: List[Tuple[str, str]]
+    # mids of the main note types that the copies will be converted to
+    main_mids: List[int]
 
-        notetype_copy_mids = [
-            x.id
-            for x in all_models
-            for matching_name in matching_names
-            if is_notetype_copy(x.name, matching_name)
-        ]
-        if not notetype_copy_mids:
-            continue
 
-        copy_mids_by_notetype_base_name[notetype_base_name] = notetype_copy_mids
-        if mw.col.models.by_name(notetype_base_name) is None:
-            for legacy_name in legacy_notetype_names(notetype_base_name):
-                if mw.col.models.by_name(legacy_name) is not None:
-                    legacy_mains_to_rename.append((legacy_name, notetype_base_name))
-                    break
+# (notetypes_state_key(), result) of the last call of _find_extra_notetype_versions
+_extra_notetype_versions_cache: Optional[Tuple[Any, ExtraNotetypeVersions]] = None
+
+
+def handle_extra_notetype_versions() -> None:
+    (
+        copy_mids_by_notetype_base_name,
+        legacy_mains_to_rename,
+        main_mids,
+    ) = _find_extra_notetype_versions()
 
     if not copy_mids_by_notetype_base_name:
         return
@@ -50,7 +60,7 @@ def handle_extra_notetype_versions() -> None:
         return
 
     mw.taskman.with_progress(
-        create_backup,
+        lambda: _create_conversion_backup(copy_mids_by_notetype_base_name, main_mids),
         on_done=lambda future: convert_extra_notetypes(
             future, copy_mids_by_notetype_base_name
         ),
@@ -59,6 +69,27 @@ def handle_extra_notetype_versions() -> None:
     )
 
 
+def _create_conversion_backup(
+    copy_mids_by_notetype_base_name: Dict[str, List[int]], main_mids: List[int]
+) -> None:
+    """Writes a snapshot of the note types and notes that will be changed by the conversion,
+    which can be restored using restore_notetype_snapshot_with_ui.
+    A full backup is only created if it is enabled in the config and there is no recent backup."""
+    copy_mids = [
+        mid for mids in copy_mids_by_notetype_base_name.values() for mid in mids
+    ]
+    create_notetype_snapshot(mids=copy_mids + main_mids, note_mids=copy_mids)
+
+    conf = mw.addonManager.getConfig(__name__)
+    if conf.get("notetype_conversion_backup", "full") != "full":
+        return
+
+    if recent_backup_exists():
+        return
+
+    create_backup()
+
+
 def convert_extra_notetypes(
     future: Future, copy_mids_by_notetype_base_name: Dict[str, List[int]]
 ) -> None:
@@ -100,6 +131,7 @@ def convert_extra_notetypes(
             # remove the notetype copy
             mw.col.models.remove(copy_mid)  # type: ignore
 
+    invalidate_notetypes_state_key()
     mw.reset()
     tooltip("Note types were converted successfully.")
 
@@ -113,7 +145,8 @@ def _build_confirmation_message(
         'for example "AnKingOverhaul-1dgs0" to "AnKingOverhaul" respectively?\n\n'
         "This will delete the extra note types and require a full upload of the "
         "collection the next time you sync with AnkiWeb. A backup will be created "
-        "before the changes are applied.\n\n"
+        "before the changes are applied. The changes can be undone using "
+        '"AnKing > Restore AnKing Note Types Snapshot".\n\n'
     )
     if legacy_mains_to_rename:
         renames = "\n".join(
@@ -131,14 +164,68 @@ def _build_confirmation_message(
     return message
 
 
-def _first_existing_notetype_name(notetype_names: List[str]) -> Optional[str]:
-    return next(
-        (
-            notetype_name
-            for notetype_name in notetype_names
-            if mw.col.models.by_name(notetype_name) is not None
-        ),
-        None,
+def _find_extra_notetype_versions() -> ExtraNotetypeVersions:
+    """Finds copies of AnKing note types in a single pass over the note type names of the collection.
+    The result is cached until the note types of the collection change."""
+    global _extra_notetype_versions_cache  # pylint: disable=global-statement
+
+    state_key = notetypes_state_key()
+    if (
+        _extra_notetype_versions_cache is not None
+        and _extra_notetype_versions_cache[0] == state_key
+    ):
+        return _extra_notetype_versions_cache[1]
+
+    base_name_by_matching_name = {
+        matching_name: notetype_base_name
+        for notetype_base_name in anking_notetype_names()
+        for matching_name in matching_notetype_names(notetype_base_name)
+    }
+    copy_re = _notetype_copy_re(tuple(base_name_by_matching_name.keys()))
+
+    mids_by_existing_name: Dict[str, int] = dict()
+    copy_mids_by_notetype_base_name: Dict[str, List[int]] = defaultdict(list)
+    for x in mw.col.models.all_names_and_ids():
+        if x.name in base_name_by_matching_name:
+            mids_by_existing_name[x.name] = x.id
+        elif m := copy_re.match(x.name):
+            notetype_base_name = base_name_by_matching_name[m.group("name")]
+            copy_mids_by_notetype_base_name[notetype_base_name].append(x.id)
+
+    result = ExtraNotetypeVersions(dict(), [], [])
+    for notetype_base_name, copy_mids in copy_mids_by_notetype_base_name.items():
+        matching_names = matching_notetype_names(notetype_base_name)
+        main_mids = [
+            mids_by_existing_name[name]
+            for name in matching_names
+            if name in mids_by_existing_name
+        ]
+        if not main_mids:
+            continue
+
+        result.copy_mids_by_notetype_base_name[notetype_base_name] = copy_mids
+        result.main_mids.extend(main_mids)
+        if notetype_base_name not in mids_by_existing_name:
+            legacy_name = next(
+                name
+                for name in legacy_notetype_names(notetype_base_name)
+                if name in mids_by_existing_name
+            )
+            result.legacy_mains_to_rename.append((legacy_name, notetype_base_name))
+
+    _extra_notetype_versions_cache = (state_key, result)
+    return result
+
+
+@lru_cache(maxsize=None)
+def _notetype_copy_re(matching_names: Tuple[str, ...]) -> re.Pattern:
+    # longer names are tried first, so that e.g. "AnKing MCAT-abcde" is recognized
+    # as a copy of "AnKing MCAT" and not of "AnKing"
+    names_re = "|".join(
+        re.escape(name) for name in sorted(matching_names, key=len, reverse=True)
+    )
+    return re.compile(
+        NOTETYPE_COPY_RE.format(notetype_base_name=f"(?P<name>{names_re})")
     )
 
 
@@ -149,5 +236,42 @@ def _rename_legacy_main_to_canonical(canonical_name: str) -> Optional["NotetypeD
             continue
         legacy_model["name"] = canonical_name
         mw.col.models.update_dict(legacy_model)
+        invalidate_notetypes_state_key()
         return legacy_model
     return None
+
+
+def restore_notetype_snapshot_with_ui() -> None:
+    if not notetype_snapshot_paths():
+        showInfo("There are no AnKing note type snapshots to restore.")
+        return
+
+    path = getFile(
+        mw,
+        "Restore AnKing Note Types Snapshot",
+        cb=None,
+        filter="*.json.gz",
+        dir=str(SNAPSHOTS_PATH),
+    )
+    if not path:
+        return
+
+    if not askUser(
+        "Do you really want to restore the note types and notes from this snapshot?<br><br>"
+        "Changes made to the notes of these note types since the snapshot was created will be lost. "
+        "After doing this Anki will require a full sync on the next synchronization with AnkiWeb.",
+        defaultno=True,
+    ):
+        return
+
+    def on_done(future: Future) -> None:
+        future.result()
+        mw.reset()
+        tooltip("Snapshot was restored successfully.")
+
+    mw.taskman.with_progress(
+        lambda: restore_notetype_snapshot(Path(str(path))),
+        on_done=on_done,
+        label="Restoring Snapshot...",
+        immediate=True,
+    )
@@ -8,3 +8,10 @@ def setup_menu(func) -> None:
     a = QAction("AnKing Note Types", menu)
     menu.addAction(a)
     a.triggered.connect(lambda: func())  # type: ignore
+
+
+def setup_restore_snapshot_menu(func) -> None:
+    menu = get_anking_menu()
+    a = QAction("Restore AnKing Note Types Snapshot", menu)
+    menu.addAction(a)
+    a.triggered.connect(lambda: func())  # type: ignore
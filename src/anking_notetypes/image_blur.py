@@ -0,0 +1,124 @@
+import re
+from fnmatch import translate
+from html import unescape
+from typing import Callable, List, Optional
+
+BLUR_CLASS = "blur"
+
+# <img> tags, ">" inside quoted attribute values doesn't end the tag
+IMG_TAG_RE = re.compile(r"""<img\b(?:[^>"']|"[^"]*"|'[^']*')*>""", re.IGNORECASE)
+ATTRIBUTE_RE = re.compile(
+    r"""(?P<name>[^\s"'>/=]+)(?:\s*=\s*(?P<value>"[^"]*"|'[^']*'|[^\s"'=<>`]+))?"""
+)
+
+
+def toggle_image_blur(html: str, src: str) -> str:
+    """Adds the blur class to the images with the given src or removes it if they have it already.
+    Only the class attributes of the matching <img> tags are changed, the rest of the html is kept as is."""
+    # most fields don't contain the image, so they don't have to be tokenized
+    text = unescape(html) if "&" in html else html
+    if src not in text:
+        return html
+
+    def toggle(classes: List[str]) -> List[str]:
+        if BLUR_CLASS in classes:
+            return [c for c in classes if c != BLUR_CLASS]
+        return [*classes, BLUR_CLASS]
+
+    return rewrite_image_classes(html, lambda img_src: img_src == src, toggle)
+
+
+def set_images_blur(html: str, blur: bool, src_matches: Callable[[str], bool]) -> str:
+    "Adds the blur class to or removes it from the images whose src src_matches."
+
+    def update(classes: List[str]) -> List[str]:
+        if blur:
+            return classes if BLUR_CLASS in classes else [*classes, BLUR_CLASS]
+        return [c for c in classes if c != BLUR_CLASS]
+
+    return rewrite_image_classes(html, src_matches, update)
+
+
+def filename_matcher(pattern: str) -> Callable[[str], bool]:
+    """Returns a function that checks if the file name of an image src matches the
+    case-insensitive glob pattern (e.g. "*.png"). An empty pattern matches all images."""
+    if not pattern.strip():
+        return lambda _: True
+
+    pattern_re = re.compile(translate(pattern.strip()), re.IGNORECASE)
+    return lambda src: bool(pattern_re.match(src.rsplit("/", 1)[-1]))
+
+
+def rewrite_image_classes(
+    html: str,
+    src_matches: Callable[[str], bool],
+    update_classes: Callable[[List[str]], List[str]],
+) -> str:
+    """Replaces the classes of the <img> tags whose src (without leading and trailing slashes)
+    src_matches with the result of update_classes. Everything else is kept as is."""
+    parts = []
+    last_end = 0
+    for tag_match in IMG_TAG_RE.finditer(html):
+        tag = tag_match.group(0)
+        new_tag = _rewrite_tag_classes(tag, src_matches, update_classes)
+        if new_tag is None:
+            continue
+        parts.append(html[last_end : tag_match.start()])
+        parts.append(new_tag)
+        last_end = tag_match.end()
+
+    if not parts:
+        return html
+
+    parts.append(html[last_end:])
+    return "".join(parts)
+
+
+def _rewrite_tag_classes(
+    tag: str,
+    src_matches: Callable[[str], bool],
+    update_classes: Callable[[List[str]], List[str]],
+) -> Optional[str]:
+    "Returns the tag with updated classes or None if the tag doesn't have to be changed."
+    src = None
+    class_match = None
+    # skip "<img"
+    for m in ATTRIBUTE_RE.finditer(tag, 4, len(tag) - 1):
+        name = m.group("name").lower()
+        if name == "src" and src is None:
+            src = _attribute_value(m)
+        elif name == "class" and class_match is None:
+            class_match = m
+
+    if src is None or not src_matches(src.strip("/")):
+        return None
+
+    classes = _attribute_value(class_match).split() if class_match else []
+    new_classes = update_classes(classes)
+    if new_classes == classes:
+        return None
+
+    if class_match is None:
+        return f'{tag[:4]} class="{" ".join(new_classes)}"{tag[4:]}'
+
+    if not new_classes:
+        # remove the attribute together with the whitespace before it
+        start = len(tag[: class_match.start()].rstrip())
+        return tag[:start] + tag[class_match.end() :]
+
+    value = class_match.group("value")
+    quote = value[0] if value and value[0] in "\"'" else '"'
+    return (
+        tag[: class_match.start()]
+        + f"class={quote}{' '.join(new_classes)}{quote}"
+        + tag[class_match.end() :]
+    )
+
+
+def _attribute_value(m: re.Match) -> str:
+    value = m.group("value")
+    if value is None:
+        return ""
+    if value[0] in "\"'":
+        value = value[1:-1]
+    return unescape(value)
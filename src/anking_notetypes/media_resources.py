@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from aqt import mw
+
+from .constants import USER_FILES_PATH
+from .timing import timed
+
+RESOURCES_PATH = Path(__file__).parent / "resources"
+
+# Downscaled and recompressed variants of bundled images (see scripts/optimize_resources.py).
+# They have the same names as the originals and are copied into the media folder instead of them.
+OPTIMIZED_RESOURCES_PATH = RESOURCES_PATH / "optimized"
+
+# Stores (size, mtime, sha1) of the bundled resources, so that they only have to be hashed
+# when they change, and the sha1 of the resources that were copied into each media folder.
+MANIFEST_PATH = USER_FILES_PATH / "resources_manifest.json"
+
+# Resources that have a version in their file name, e.g. "__ankingio-0.6.2.js".
+# Each release adds new versions of them to the media folder, superseded versions are removed
+# once no template references them anymore.
+# Don't remove families from this list when they are not shipped anymore, so that their old
+# versions keep being cleaned up.
+VERSIONED_RESOURCE_FAMILIES = [
+    "__ankingio",
+]
+VERSIONED_RESOURCE_RE = re.compile(
+    rf"(?P<family>{'|'.join(re.escape(x) for x in VERSIONED_RESOURCE_FAMILIES)})"
+    r"-(?P<version>\d+(?:\.\d+)*)(?P<extension>\.[a-z]+)"
+)
+
+
+def sync_resources_into_media_folder() -> None:
+    """Copies new or changed resources of the note types into the collection media folder.
+    The work is done in the background. If nothing changed since the last sync,
+    this only needs one listing of each folder and no file contents are read."""
+    media_dir = mw.col.media.dir()
+
+    def on_done(future: Future) -> None:
+        future.result()
+
+    mw.taskman.run_in_background(
+        lambda: _sync_resources_into_media_folder(media_dir), on_done
+    )
+
+
+@timed("resource_sync")
+def _sync_resources_into_media_folder(media_dir: str) -> None:
+    manifest = _load_manifest()
+    files = _resource_files()
+    bundled = _bundled_resources(manifest["bundled"], files)
+    synced: Dict[str, str] = manifest["media"].setdefault(media_dir, {})
+    media_sizes, superseded = _scan_media_folder(media_dir, bundled.keys())
+
+    manifest_changed = bundled != manifest["bundled"]
+    replaced_existing_files = False
+    for name, (size, _, sha1) in bundled.items():
+        if synced.get(name) == sha1 and media_sizes.get(name) == size:
+            continue
+
+        # the file may already be up to date if it was copied before the manifest existed
+        target = Path(media_dir) / name
+        if media_sizes.get(name) != size or _file_hash(target) != sha1:
+            shutil.copyfile(files[name].path, target)
+            replaced_existing_files = replaced_existing_files or name in media_sizes
+
+        synced[name] = sha1
+        manifest_changed = True
+
+    if replaced_existing_files:
+        # Overwriting a file doesn't change the modification time of the media folder,
+        # and Anki only looks for changed media files when it changed.
+        os.utime(media_dir)
+
+    if superseded:
+        removed = _remove_unreferenced_resources(superseded)
+        for name in removed:
+            synced.pop(name, None)
+        manifest_changed = manifest_changed or bool(removed)
+
+    if manifest_changed:
+        manifest["bundled"] = bundled
+        _save_manifest(manifest)
+
+
+def _resource_files() -> Dict[str, os.DirEntry]:
+    """Returns a dict that maps resource names to the files that should be copied into
+    the media folder, which are the optimized variants if they exist."""
+    result = dict()
+    for folder in [RESOURCES_PATH, OPTIMIZED_RESOURCES_PATH]:
+        if not folder.exists():
+            continue
+        for entry in os.scandir(folder):
+            if entry.is_file():
+                result[entry.name] = entry
+    return result
+
+
+def _bundled_resources(
+    cached: Dict[str, Any], files: Dict[str, os.DirEntry]
+) -> Dict[str, Any]:
+    "Returns a dict that maps resource names to [size, mtime, sha1]."
+    result = dict()
+    for entry in files.values():
+        stat = entry.stat()
+        cached_entry = cached.get(entry.name)
+        if cached_entry and cached_entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            result[entry.name] = cached_entry
+        else:
+            result[entry.name] = [
+                stat.st_size,
+                stat.st_mtime_ns,
+                _file_hash(Path(entry.path)),
+            ]
+    return result
+
+
+def _scan_media_folder(
+    media_dir: str, bundled_names: Iterable[str]
+) -> Tuple[Dict[str, int], List[str]]:
+    """Lists the media folder once and returns the sizes of the files with the bundled names
+    and the names of versioned resources that are superseded by a newer bundled version."""
+    bundled_names = set(bundled_names)
+    newest_versions = _newest_versions(bundled_names)
+
+    sizes = dict()
+    superseded = []
+    for entry in os.scandir(media_dir):
+        if entry.name in bundled_names:
+            sizes[entry.name] = entry.stat().st_size
+        elif (m := VERSIONED_RESOURCE_RE.fullmatch(entry.name)) and (
+            _version(m) < newest_versions.get(_family(m), ())
+        ):
+            superseded.append(entry.name)
+    return sizes, superseded
+
+
+def _newest_versions(names: Iterable[str]) -> Dict[Tuple[str, str], Tuple[int, ...]]:
+    result: Dict[Tuple[str, str], Tuple[int, ...]] = dict()
+    for name in names:
+        if m := VERSIONED_RESOURCE_RE.fullmatch(name):
+            result[_family(m)] = max(_version(m), result.get(_family(m), ()))
+    return result
+
+
+def _family(m: re.Match) -> Tuple[str, str]:
+    return (m.group("family"), m.group("extension"))
+
+
+def _version(m: re.Match) -> Tuple[int, ...]:
+    return tuple(int(x) for x in m.group("version").split("."))
+
+
+def _remove_unreferenced_resources(names: List[str]) -> List[str]:
+    """Moves the resources with the given names that are not referenced by the templates
+    or styling of any note type to the media trash. Returns the names of the removed files."""
+    referenced = _referenced_versioned_resources()
+    to_remove = [name for name in names if name not in referenced]
+    if to_remove:
+        mw.col.media.trash_files(to_remove)
+    return to_remove
+
+
+def _referenced_versioned_resources() -> Set[str]:
+    result: Set[str] = set()
+    for x in mw.col.models.all_names_and_ids():
+        model = mw.col.models.get(x.id)  # type: ignore
+        texts = [model["css"]]
+        for template in model["tmpls"]:
+            texts.extend((template["qfmt"], template["afmt"]))
+        result.update(
+            m.group(0) for m in VERSIONED_RESOURCE_RE.finditer("".join(texts))
+        )
+    return result
+
+
+def _file_hash(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _load_manifest() -> Dict[str, Any]:
+    try:
+        manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        manifest = dict()
+    manifest.setdefault("bundled", dict())
+    manifest.setdefault("media", dict())
+    return manifest
+
+
+def _save_manifest(manifest: Dict[str, Any]) -> None:
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    MANIFEST_PATH.write_text(json.dumps(manifest), encoding="utf-8")
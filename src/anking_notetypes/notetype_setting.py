@@ -5,6 +5,7 @@ from typing import Any, Callable, Dict, OrderedDict, Union, List
 
 from .ankiaddonconfig import ConfigLayout, ConfigManager
 from .notetype_setting_definitions import anking_notetype_names
+from .timing import timed
 
 try:
     from anki.models import NotetypeDict  # pylint: disable=unused-import
@@ -59,9 +60,6 @@ class NotetypeSetting(ABC):
 
     def register_general_setting(self, conf: ConfigManager):
         def update_all(key, value):
-            if self.key("general") != key:
-                return
-
             # sets the config value for all anking notetypes
             # even if they dont have this setting available
             # (in this case it will be ignored)
@@ -70,7 +68,7 @@ class NotetypeSetting(ABC):
             conf.config_window.update_widgets()
 
         self.register_general_setting_hook = update_all
-        conf.on_change(update_all)
+        conf.on_change(update_all, key=self.key("general"))
 
     def unregister_general_setting(self, conf: ConfigManager):
         assert (
@@ -86,6 +84,7 @@ class NotetypeSetting(ABC):
         )
 
     # can raise NotetypeSettingException
+    @timed("setting_parsing")
     def setting_value(self, model: "NotetypeDict") -> Any:
         try:
             section = self._relevant_template_sections(model)[0]
@@ -97,6 +96,7 @@ class NotetypeSetting(ABC):
         return result
 
     # can raise NotetypeSettingException
+    @timed("model_rewriting")
     def updated_model(
         self, model: "NotetypeDict", notetype_base_name: str, conf: ConfigManager
     ) -> "NotetypeDict":
@@ -9,6 +9,7 @@ from .notetype_renames import (
     legacy_notetype_names,
     matching_notetype_names,
 )
+from .timing import timed
 
 try:
     from anki.models import NotetypeDict  # pylint: disable=unused-import
@@ -677,6 +678,7 @@ def anking_notetype_names():
     return list(anking_notetype_templates().keys())
 
 
+@timed("template_loading")
 def anking_notetype_templates() -> Dict[str, Tuple[str, str, str]]:
     result = dict()
     for x in ANKING_NOTETYPES_PATH.iterdir():
@@ -696,6 +698,7 @@ def anking_notetype_templates() -> Dict[str, Tuple[str, str, str]]:
     return result
 
 
+@timed("template_loading")
 def anking_notetype_model(notetype_name: str) -> "NotetypeDict":
     notetype_name = canonical_notetype_name(notetype_name)
     notetype_folder_name = _notetype_folder_name(notetype_name)
@@ -0,0 +1,122 @@
+import gzip
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+from anki.utils import ids2str
+from aqt import mw
+
+from .constants import USER_FILES_PATH
+from .utils import invalidate_notetypes_state_key
+
+SNAPSHOTS_PATH = USER_FILES_PATH / "snapshots"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# older snapshots are removed when a new one is created
+MAX_SNAPSHOTS = 10
+
+# a full backup is skipped if Anki created one within this time
+RECENT_BACKUP_MAX_AGE_SECS = 30 * 60
+
+
+def create_notetype_snapshot(mids: Iterable[int], note_mids: Iterable[int]) -> Path:
+    """Writes a compact rollback snapshot of the note types with the given mids and the
+    (note id, note type id, fields) rows of the notes of the note types with the given note_mids
+    to SNAPSHOTS_PATH. Returns the path of the snapshot."""
+    models = [mw.col.models.get(mid) for mid in sorted(set(mids))]  # type: ignore
+    snapshot = {
+        "version": SNAPSHOT_FORMAT_VERSION,
+        "created": int(time.time()),
+        "notetypes": [model for model in models if model is not None],
+        "notes": mw.col.db.all(
+            f"select id, mid, flds from notes where mid in {ids2str(note_mids)}"
+        ),
+    }
+
+    SNAPSHOTS_PATH.mkdir(parents=True, exist_ok=True)
+    path = SNAPSHOTS_PATH / f"notetypes-{time.strftime('%Y-%m-%d-%H.%M.%S')}.json.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+
+    _remove_old_snapshots()
+    return path
+
+
+def read_notetype_snapshot(path: Path) -> Dict[str, Any]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        snapshot = json.load(f)
+
+    if snapshot.get("version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {snapshot.get('version')}")
+
+    return snapshot
+
+
+def restore_notetype_snapshot(path: Path) -> None:
+    """Restores the note types and notes contained in the snapshot.
+    Note types that were removed since the snapshot was taken are added back
+    (with new ids) and their notes are moved back to them."""
+    snapshot = read_notetype_snapshot(path)
+
+    # The notes are written to the database directly, which can't be undone
+    # and needs a full sync.
+    if hasattr(mw.col, "clear_python_undo"):
+        mw.col.clear_python_undo()
+    else:  # < 2.1.45
+        mw.col.clearUndo()  # type: ignore
+    if hasattr(mw.col, "mod_schema"):
+        mw.col.mod_schema(check=False)
+    else:  # < 2.1.45
+        mw.col.modSchema(check=False)  # type: ignore
+
+    new_mid_by_old_mid: Dict[int, int] = {}
+    for model in snapshot["notetypes"]:
+        model["usn"] = -1  # triggers full sync
+        if mw.col.models.get(model["id"]) is not None:  # type: ignore
+            mw.col.models.update_dict(model)  # type: ignore
+        else:
+            old_mid = model["id"]
+            model["id"] = 0
+            result = mw.col.models.add_dict(model)  # type: ignore
+            # < 2.1.45: add_dict is an alias of ModelManager.add, which returns None
+            # and sets the id of the model instead
+            new_mid_by_old_mid[old_mid] = getattr(result, "id", None) or model["id"]
+
+    now = int(time.time())
+    mw.col.db.executemany(
+        "update notes set mid = ?, flds = ?, mod = ?, usn = -1 where id = ?",
+        [
+            (new_mid_by_old_mid.get(mid, mid), flds, now, nid)
+            for nid, mid, flds in snapshot["notes"]
+        ],
+    )
+    # update sort fields and checksums of the changed notes
+    nids = [nid for nid, _, _ in snapshot["notes"]]
+    if hasattr(mw.col, "after_note_updates"):
+        mw.col.after_note_updates(nids, mark_modified=False, generate_cards=False)
+    else:  # < 2.1.45
+        mw.col.updateFieldCache(nids)  # type: ignore
+
+    invalidate_notetypes_state_key()
+
+
+def notetype_snapshot_paths() -> List[Path]:
+    "Returns the paths of the existing snapshots, newest first."
+    if not SNAPSHOTS_PATH.exists():
+        return []
+    return sorted(SNAPSHOTS_PATH.glob("notetypes-*.json.gz"), reverse=True)
+
+
+def recent_backup_exists() -> bool:
+    backup_folder = Path(mw.pm.backupFolder())
+    now = time.time()
+    return any(
+        now - path.stat().st_mtime < RECENT_BACKUP_MAX_AGE_SECS
+        for path in backup_folder.glob("backup-*")
+    )
+
+
+def _remove_old_snapshots() -> None:
+    for path in notetype_snapshot_paths()[MAX_SNAPSHOTS:]:
+        path.unlink()
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from .constants import USER_FILES_PATH
+
+# Opt-in timing of the code paths that can make the add-on slow, e.g. parsing the settings of
+# the note types. It's enabled by setting the environment variable or the config key.
+# The durations and call counts of each category are written to the log when the profile
+# is closed and can be seen in the Diagnostics tab of the AnKing Note Types window.
+TIMING_ENV_VAR = "ANKING_NOTETYPES_TIMING"
+TIMING_CONFIG_KEY = "timing_diagnostics"
+
+TIMING_LOG_PATH = USER_FILES_PATH / "timing.log"
+TIMING_LOG_MAX_BYTES = 512 * 1024
+TIMING_LOG_BACKUP_COUNT = 3
+
+# the stats of the last session, shown in the Diagnostics tab
+LAST_SESSION_PATH = USER_FILES_PATH / "timing_last_session.json"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_ENABLED_BY_ENV = os.environ.get(TIMING_ENV_VAR, "") not in ("", "0")
+_enabled = _ENABLED_BY_ENV
+# [call count, total seconds, max seconds] by category
+_stats: Dict[str, List[float]] = {}
+_stats_lock = threading.Lock()
+_session_start = time.time()
+# categories that are being timed in the current thread, nested calls of the same category
+# are only counted once
+_active = threading.local()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def is_enabled_by_env() -> bool:
+    return _ENABLED_BY_ENV
+
+
+def set_enabled(enabled: bool) -> None:
+    global _enabled  # pylint: disable=global-statement
+    _enabled = enabled
+
+
+def apply_config(config: Dict[str, Any]) -> None:
+    set_enabled(_ENABLED_BY_ENV or bool(config.get(TIMING_CONFIG_KEY, False)))
+
+
+def timed(category: str) -> Callable[[F], F]:
+    "Decorator that records the durations of the calls of the function if timing is enabled."
+
+    def decorator(fn: F) -> F:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with timer(category):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+@contextmanager
+def timer(category: str) -> Iterator[None]:
+    "Records the duration of the block if timing is enabled."
+    if not _enabled:
+        yield
+        return
+
+    active = getattr(_active, "categories", None)
+    if active is None:
+        active = _active.categories = set()
+    if category in active:
+        yield
+        return
+
+    active.add(category)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.discard(category)
+        record(category, time.perf_counter() - start)
+
+
+def record(category: str, secs: float) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(category, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += secs
+        stats[2] = max(stats[2], secs)
+
+
+def session_stats() -> Dict[str, Any]:
+    "Returns the stats of the current session."
+    with _stats_lock:
+        categories = {
+            category: {"count": count, "total_secs": total, "max_secs": max_secs}
+            for category, (count, total, max_secs) in sorted(_stats.items())
+        }
+    return {"start": _session_start, "categories": categories}
+
+
+def last_session_stats() -> Optional[Dict[str, Any]]:
+    "Returns the stats of the last session that recorded timings."
+    try:
+        return json.loads(LAST_SESSION_PATH.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def end_session() -> None:
+    """Writes the stats of the current session to the log and makes them the last session.
+    Starts a new session."""
+    global _session_start  # pylint: disable=global-statement
+
+    stats = session_stats()
+    with _stats_lock:
+        _stats.clear()
+        _session_start = time.time()
+    if not stats["categories"]:
+        return
+
+    USER_FILES_PATH.mkdir(parents=True, exist_ok=True)
+    LAST_SESSION_PATH.write_text(json.dumps(stats), encoding="utf-8")
+    _write_to_log(format_stats(stats))
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    "Returns the stats as a table, the categories that took the most time first."
+    start = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stats["start"]))
+    lines = [f"Session started {start}"]
+    categories = sorted(
+        stats["categories"].items(),
+        key=lambda item: item[1]["total_secs"],
+        reverse=True,
+    )
+    if not categories:
+        lines.append("No timings recorded.")
+    for category, category_stats in categories:
+        lines.append(
+            f"{category:<20} {category_stats['count']:>7} calls "
+            f"{category_stats['total_secs'] * 1000:>10.1f} ms total "
+            f"{category_stats['max_secs'] * 1000:>9.1f} ms max"
+        )
+    return "\n".join(lines)
+
+
+def _write_to_log(text: str) -> None:
+    # imported here because the module is imported when the add-on is loaded
+    from logging.handlers import RotatingFileHandler
+
+    handler = RotatingFileHandler(
+        TIMING_LOG_PATH,
+        maxBytes=TIMING_LOG_MAX_BYTES,
+        backupCount=TIMING_LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    try:
+        handler.emit(logging.makeLogRecord({"msg": f"{text}\n", "levelno": 20}))
+    finally:
+        handler.close()
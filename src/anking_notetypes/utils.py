@@ -1,8 +1,9 @@
 import re
 import time
 from copy import deepcopy
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+from anki.utils import ids2str
 from aqt import mw
 
 from .constants import (
@@ -12,14 +13,33 @@ from .constants import (
     ANKIHUB_HTML_END_COMMENT_RE,
     ANKIHUB_TEMPLATE_SNIPPET_RE,
 )
-from .notetype_renames import renamed_notetype_name
-from .notetype_setting_definitions import anking_notetype_model
+from .notetype_renames import (
+    canonical_notetype_name,
+    matching_notetype_names,
+    renamed_notetype_name,
+)
+from .notetype_setting_definitions import (
+    anking_notetype_model,
+    anking_notetype_names,
+    is_ankihub_notetype_version,
+    is_notetype_copy,
+    notetype_base_name,
+)
 
 try:
     from anki.models import NotetypeDict  # type: ignore # pylint: disable=unused-import
 except:
     pass
 
+# number of note ids that are put into one query by note_type_ids_for_nids
+NIDS_QUERY_CHUNK_SIZE = 10000
+
+# incremented by invalidate_notetypes_state_key
+_notetypes_state_generation = 0
+
+# (notetypes_state_key(), result) of the last call of field_names_by_mid
+_field_names_by_mid_cache: Optional[Tuple[Any, Dict[int, List[str]]]] = None
+
 
 def update_notetype_to_newest_version(
     model: "NotetypeDict", notetype_base_name: str
@@ -117,6 +137,54 @@ def _updated_note_type_content(
     )
 
 
+def note_type_version(model: "NotetypeDict") -> Optional[str]:
+    """Returns the version of the model or None if it is not specified.
+    The version is specified on the top of the front template of the model."""
+    front = model["tmpls"][0]["qfmt"]
+    m = re.match(r"<!-- version ([\w\d]+) -->\n", front)
+    if not m:
+        return None
+    return m.group(1)
+
+
+def models_with_available_updates() -> List["NotetypeDict"]:
+    return [
+        model
+        for nt_base_name in anking_notetype_names()
+        for model in note_type_versions(nt_base_name)
+        if _new_version_available_for_model(model)
+    ]
+
+
+def _new_version_available_for_model(model: "NotetypeDict") -> bool:
+    current_version = note_type_version(model)
+    base_name = notetype_base_name(model["name"])
+    newest_version = note_type_version(anking_notetype_model(base_name))
+    return current_version != newest_version
+
+
+def note_type_versions(nt_base_name: str) -> List["NotetypeDict"]:
+    """Returns a list of all notetype versions of the notetype in the collection.
+    Version of a note type are created by the AnkiHub add-on and by copying
+    the base AnKing note types or importing them from different sources."""
+    matching_names = matching_notetype_names(canonical_notetype_name(nt_base_name))
+    models = [
+        mw.col.models.get(x.id)  # type: ignore
+        for x in mw.col.models.all_names_and_ids()
+        for matching_name in matching_names
+        if _matches_notetype_version(x.name, matching_name)
+    ]
+    return models
+
+
+def _matches_notetype_version(model_name: str, base_name: str) -> bool:
+    return (
+        model_name == base_name
+        or is_ankihub_notetype_version(model_name, base_name)
+        or is_notetype_copy(model_name, base_name)
+    )
+
+
 def adjust_fields(
     cur_model_fields: List[Dict], new_model_fields: List[Dict]
 ) -> List[Dict]:
@@ -172,6 +240,63 @@ def adjust_fields(
     return final_fields
 
 
+def notetypes_state_key() -> Tuple[Any, ...]:
+    """Returns a value that changes whenever a note type of the collection is added,
+    removed or modified. Can be used to invalidate caches derived from the note types.
+    Modification times only have a resolution of one second, so changes made by this add-on
+    should be followed by a call of invalidate_notetypes_state_key."""
+    return (
+        mw.col.path,
+        _notetypes_state_generation,
+        *mw.col.db.first(
+            "select count(), max(mtime_secs), max(usn), sum(id), (select scm from col) "
+            "from notetypes"
+        ),
+    )
+
+
+def invalidate_notetypes_state_key() -> None:
+    "Makes notetypes_state_key return a new value, which invalidates the caches that use it."
+    global _notetypes_state_generation  # pylint: disable=global-statement
+    _notetypes_state_generation += 1
+
+
+def note_type_ids_for_nids(nids: Sequence[int]) -> List[int]:
+    """Returns the distinct ids of the note types of the notes with the given ids.
+    The notes are queried in chunks to keep the queries short for large selections."""
+    result = set()
+    for start in range(0, len(nids), NIDS_QUERY_CHUNK_SIZE):
+        chunk = nids[start : start + NIDS_QUERY_CHUNK_SIZE]
+        result.update(
+            mw.col.db.list(
+                f"select distinct mid from notes where id in {ids2str(chunk)}"
+            )
+        )
+    return sorted(result)
+
+
+def field_names_by_mid() -> Dict[int, List[str]]:
+    """Returns a dict that maps the ids of the note types of the collection to their field names.
+    The result is cached until the note types of the collection change."""
+    global _field_names_by_mid_cache  # pylint: disable=global-statement
+
+    state_key = notetypes_state_key()
+    if (
+        _field_names_by_mid_cache is not None
+        and _field_names_by_mid_cache[0] == state_key
+    ):
+        return _field_names_by_mid_cache[1]
+
+    result: Dict[int, List[str]] = dict()
+    for mid, name in mw.col.db.execute(
+        "select ntid, name from fields order by ntid, ord"
+    ):
+        result.setdefault(mid, []).append(name)
+
+    _field_names_by_mid_cache = (state_key, result)
+    return result
+
+
 def create_backup() -> None:
     try:
         mw.col.create_backup(
@@ -1,46 +1,3 @@
-require("anki/EditorField").lifecycle.onMount((field) => {
-    (async () => {
-        const occlusionCss = `
-img {
-  max-width: 100% !important;
-  max-height: var(--anking-closet-max-height);
-}
-
-.anking-rect__rect {
-  fill: moccasin;
-  stroke: olive;
-}
-
-.is-active anking-rect__rect {
-  fill: salmon;
-  stroke: yellow;
-}
-
-.anking-rect__ellipsis {
-  fill: transparent;
-  stroke: transparent;
-}
-
-.anking-rect__label {
-  stroke: black;
-  stroke-width: 0.5;
-}`;
-        const fieldElement = await field.element;
-        if (!fieldElement.hasAttribute("has-occlusion-style")) {
-            const style = document.createElement("style");
-            style.id = "anking-occlusion-style";
-            style.rel = "stylesheet";
-            style.textContent = occlusionCss;
-            const richTextEditable = await EditorIO.get(
-                field.editingArea.editingInputs
-            ).find((input) => input.name === "rich-text").element;
-            richTextEditable.getRootNode().prepend(style);
-
-            fieldElement.setAttribute("has-occlusion-style", "");
-        }
-    })();
-});
-
 var EditorIO = {
     NoteEditor: require("anki/NoteEditor"),
     get: require("svelte/store").get,
@@ -319,4 +276,58 @@ var EditorIO = {
             `${value}px`
         );
     },
+
+    /**************** OCCLUSION STYLE *****************/
+    occlusionCss: `
+img {
+  max-width: 100% !important;
+  max-height: var(--anking-closet-max-height);
+}
+
+.anking-rect__rect {
+  fill: moccasin;
+  stroke: olive;
+}
+
+.is-active anking-rect__rect {
+  fill: salmon;
+  stroke: yellow;
+}
+
+.anking-rect__ellipsis {
+  fill: transparent;
+  stroke: transparent;
+}
+
+.anking-rect__label {
+  stroke: black;
+  stroke-width: 0.5;
+}`,
+
+    addOcclusionStyle: async (field) => {
+        const fieldElement = await field.element;
+        if (!fieldElement.hasAttribute("has-occlusion-style")) {
+            // set before waiting, so that the style is only added once when the field
+            // is mounted while the style is added to the mounted fields
+            fieldElement.setAttribute("has-occlusion-style", "");
+            const style = document.createElement("style");
+            style.id = "anking-occlusion-style";
+            style.rel = "stylesheet";
+            style.textContent = EditorIO.occlusionCss;
+            const richTextEditable = await EditorIO.get(
+                field.editingArea.editingInputs
+            ).find((input) => input.name === "rich-text").element;
+            richTextEditable.getRootNode().prepend(style);
+        }
+    },
+
+    // the fields of the editor are reused for the next notes, so fields mounted before
+    // this script was loaded need the style too
+    addOcclusionStyleToMountedFields: () => {
+        for (const field of EditorIO.NoteEditor.instances[0]?.fields ?? []) {
+            EditorIO.addOcclusionStyle(field);
+        }
+    },
 };
+
+require("anki/EditorField").lifecycle.onMount(EditorIO.addOcclusionStyle);
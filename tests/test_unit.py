@@ -1,10 +1,33 @@
 # pylint: disable=protected-access
-from unittest.mock import MagicMock, patch
+import json
+import os
+import re
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, call, patch
 
 import pytest
 
-from src.anking_notetypes import notetype_setting_definitions, utils
-from src.anking_notetypes.gui import extra_notetype_versions
+import src.anking_notetypes as anking_notetypes
+from benchmarks import (
+    bench_import,
+    bench_memory,
+    bench_regex,
+    compare,
+    synthetic_collection,
+)
+from src.anking_notetypes import (
+    editor,
+    image_blur,
+    media_resources,
+    notetype_setting_definitions,
+    notetype_snapshot,
+    timing,
+    utils,
+)
+from src.anking_notetypes.ankiaddonconfig import collapsible_section, manager, window
+from src.anking_notetypes.gui import config_window, extra_notetype_versions
 from src.anking_notetypes.notetype_renames import (
     NOTETYPE_RENAMES,
     canonical_notetype_name,
@@ -207,6 +230,69 @@ class TestRenameLegacyMainToCanonical:
         mw_mock.col.models.update_dict.assert_not_called()
 
 
+class TestFindExtraNotetypeVersions:
+    @pytest.fixture
+    def mw_mock(self):
+        mw_mock = MagicMock()
+        mw_mock.col.db.first.return_value = [4, 0, 10]
+        mw_mock.col.models.all_names_and_ids.return_value = [
+            SimpleNamespace(id=1, name="AnKing"),
+            SimpleNamespace(id=2, name="AnKing-abcde"),
+            SimpleNamespace(id=3, name="Old-AnKing"),
+            SimpleNamespace(id=4, name="Old-AnKing-1dgs0"),
+            SimpleNamespace(id=5, name="AnKingOverhaul-fghij"),
+        ]
+        with patch.object(extra_notetype_versions, "mw", mw_mock), patch.object(
+            utils, "mw", mw_mock
+        ), patch.object(
+            extra_notetype_versions, "_extra_notetype_versions_cache", None
+        ), patch.object(
+            extra_notetype_versions,
+            "anking_notetype_names",
+            return_value=["AnKing", "AnKingOverhaul"],
+        ), patch.dict(
+            NOTETYPE_RENAMES, FAKE_RENAMES
+        ):
+            yield mw_mock
+
+    def test_finds_copies_of_notetypes_with_existing_main(self, mw_mock):
+        result = extra_notetype_versions._find_extra_notetype_versions()
+
+        assert result.copy_mids_by_notetype_base_name == {
+            "AnKing": [2],
+            "AnKingOverhaul": [4, 5],
+        }
+        assert sorted(result.main_mids) == [1, 3]
+        assert result.legacy_mains_to_rename == [("Old-AnKing", "AnKingOverhaul")]
+        mw_mock.col.models.by_name.assert_not_called()
+
+    def test_result_is_cached_until_notetypes_change(self, mw_mock):
+        first = extra_notetype_versions._find_extra_notetype_versions()
+        second = extra_notetype_versions._find_extra_notetype_versions()
+        assert first is second
+        assert mw_mock.col.models.all_names_and_ids.call_count == 1
+
+        mw_mock.col.db.first.return_value = [3, 0, 6]
+        extra_notetype_versions._find_extra_notetype_versions()
+        assert mw_mock.col.models.all_names_and_ids.call_count == 2
+
+    def test_cache_is_invalidated_by_changes_within_the_same_second(self, mw_mock):
+        extra_notetype_versions._find_extra_notetype_versions()
+
+        # the modification times and the other values of the state key don't change
+        # when a note type is renamed in the same second
+        legacy_model = {"name": "Old-AnKing"}
+        mw_mock.col.models.by_name.side_effect = lambda name: (
+            legacy_model if name == "Old-AnKing" else None
+        )
+        extra_notetype_versions._rename_legacy_main_to_canonical("AnKingOverhaul")
+        mw_mock.col.models.all_names_and_ids.return_value[2].name = "AnKingOverhaul"
+
+        result = extra_notetype_versions._find_extra_notetype_versions()
+        assert mw_mock.col.models.all_names_and_ids.call_count == 2
+        assert result.legacy_mains_to_rename == []
+
+
 class TestConvertExtraNotetypes:
     def test_canonical_main_present_skips_legacy_rename(self):
         canonical_model = {
@@ -241,3 +327,1215 @@ class TestConvertExtraNotetypes:
 
         rename_mock.assert_not_called()
         mw_mock.col.models.remove.assert_called_once_with(2)
+
+
+@pytest.fixture
+def snapshots_path(tmp_path):
+    with patch.object(notetype_snapshot, "SNAPSHOTS_PATH", tmp_path / "snapshots"):
+        yield tmp_path / "snapshots"
+
+
+class TestNotetypeSnapshot:
+    def test_restores_removed_notetype_and_its_notes(
+        self, snapshots_path  # pylint: disable=unused-argument
+    ):
+        copy_model = {"id": 2, "name": "AnKingOverhaul-abcde", "flds": []}
+        mw_mock = MagicMock()
+        mw_mock.col.models.get.side_effect = lambda mid: {2: copy_model}.get(mid)
+        mw_mock.col.db.all.return_value = [[10, 2, "front\x1fback"]]
+
+        with patch.object(notetype_snapshot, "mw", mw_mock):
+            path = notetype_snapshot.create_notetype_snapshot(mids=[2], note_mids=[2])
+
+            # the note type copy got removed by the conversion
+            mw_mock.col.models.get.side_effect = lambda mid: None
+            mw_mock.col.models.add_dict.return_value.id = 3
+            notetype_snapshot.restore_notetype_snapshot(path)
+
+        added_model = mw_mock.col.models.add_dict.call_args[0][0]
+        assert added_model["name"] == "AnKingOverhaul-abcde"
+        assert added_model["id"] == 0
+        rows = mw_mock.col.db.executemany.call_args[0][1]
+        assert [(mid, flds, nid) for mid, flds, _, nid in rows] == [
+            (3, "front\x1fback", 10)
+        ]
+
+    def test_restores_removed_notetype_on_old_anki_versions(
+        self, snapshots_path  # pylint: disable=unused-argument
+    ):
+        copy_model = {"id": 2, "name": "AnKingOverhaul-abcde", "flds": []}
+        mw_mock = MagicMock()
+        mw_mock.col.models.get.side_effect = lambda mid: {2: copy_model}.get(mid)
+        mw_mock.col.db.all.return_value = [[10, 2, "front\x1fback"]]
+
+        # ModelManager.add of Anki < 2.1.45 returns None and sets the id of the model
+        def add(model):
+            model["id"] = 3
+
+        with patch.object(notetype_snapshot, "mw", mw_mock):
+            path = notetype_snapshot.create_notetype_snapshot(mids=[2], note_mids=[2])
+
+            mw_mock.col.models.get.side_effect = lambda mid: None
+            mw_mock.col.models.add_dict.side_effect = add
+            notetype_snapshot.restore_notetype_snapshot(path)
+
+        rows = mw_mock.col.db.executemany.call_args[0][1]
+        assert [(mid, flds, nid) for mid, flds, _, nid in rows] == [
+            (3, "front\x1fback", 10)
+        ]
+
+    def test_updates_existing_notetype(
+        self, snapshots_path  # pylint: disable=unused-argument
+    ):
+        main_model = {"id": 1, "name": "AnKingMCAT", "flds": []}
+        mw_mock = MagicMock()
+        mw_mock.col.models.get.return_value = main_model
+        mw_mock.col.db.all.return_value = []
+
+        with patch.object(notetype_snapshot, "mw", mw_mock):
+            path = notetype_snapshot.create_notetype_snapshot(mids=[1], note_mids=[])
+            notetype_snapshot.restore_notetype_snapshot(path)
+
+        mw_mock.col.models.add_dict.assert_not_called()
+        assert mw_mock.col.models.update_dict.call_args[0][0]["name"] == "AnKingMCAT"
+
+    def test_restore_clears_undo_and_marks_schema_modified_before_writing(
+        self, snapshots_path  # pylint: disable=unused-argument
+    ):
+        mw_mock = MagicMock()
+        mw_mock.col.models.get.return_value = {"id": 1, "name": "AnKingMCAT"}
+        mw_mock.col.db.all.return_value = [[10, 1, "front"]]
+
+        with patch.object(notetype_snapshot, "mw", mw_mock):
+            path = notetype_snapshot.create_notetype_snapshot(mids=[1], note_mids=[1])
+            notetype_snapshot.restore_notetype_snapshot(path)
+
+        method_names = [name for name, _, _ in mw_mock.col.method_calls]
+        assert method_names.index("clear_python_undo") < method_names.index(
+            "db.executemany"
+        )
+        assert method_names.index("mod_schema") < method_names.index("db.executemany")
+        mw_mock.col.after_note_updates.assert_called_once_with(
+            [10], mark_modified=False, generate_cards=False
+        )
+
+    def test_restore_on_old_anki_versions(
+        self, snapshots_path  # pylint: disable=unused-argument
+    ):
+        mw_mock = MagicMock()
+        del mw_mock.col.clear_python_undo
+        del mw_mock.col.mod_schema
+        del mw_mock.col.after_note_updates
+        mw_mock.col.models.get.return_value = {"id": 1, "name": "AnKingMCAT"}
+        mw_mock.col.db.all.return_value = [[10, 1, "front"]]
+
+        with patch.object(notetype_snapshot, "mw", mw_mock):
+            path = notetype_snapshot.create_notetype_snapshot(mids=[1], note_mids=[1])
+            notetype_snapshot.restore_notetype_snapshot(path)
+
+        mw_mock.col.clearUndo.assert_called_once()
+        mw_mock.col.modSchema.assert_called_once_with(check=False)
+        mw_mock.col.updateFieldCache.assert_called_once_with([10])
+
+    def test_keeps_only_newest_snapshots(self, snapshots_path):
+        snapshots_path.mkdir()
+        for i in range(notetype_snapshot.MAX_SNAPSHOTS + 2):
+            (snapshots_path / f"notetypes-2020-01-01-00.00.{i:02}.json.gz").touch()
+
+        notetype_snapshot._remove_old_snapshots()
+
+        paths = notetype_snapshot.notetype_snapshot_paths()
+        assert len(paths) == notetype_snapshot.MAX_SNAPSHOTS
+        assert paths[0].name == "notetypes-2020-01-01-00.00.11.json.gz"
+
+    def test_recent_backup_exists(self, tmp_path):
+        mw_mock = MagicMock()
+        mw_mock.pm.backupFolder.return_value = str(tmp_path)
+
+        with patch.object(notetype_snapshot, "mw", mw_mock):
+            assert not notetype_snapshot.recent_backup_exists()
+            (tmp_path / "backup-2020-01-01-00.00.00.colpkg").touch()
+            assert notetype_snapshot.recent_backup_exists()
+
+
+class TestCreateConversionBackup:
+    @pytest.fixture
+    def mocks(self):
+        mw_mock = MagicMock()
+        with patch.object(extra_notetype_versions, "mw", mw_mock), patch.object(
+            extra_notetype_versions, "create_notetype_snapshot"
+        ) as snapshot_mock, patch.object(
+            extra_notetype_versions, "recent_backup_exists", return_value=False
+        ) as recent_backup_mock, patch.object(
+            extra_notetype_versions, "create_backup"
+        ) as backup_mock:
+            yield SimpleNamespace(
+                mw=mw_mock,
+                snapshot=snapshot_mock,
+                recent_backup=recent_backup_mock,
+                backup=backup_mock,
+            )
+
+    def test_creates_snapshot_and_full_backup(self, mocks):
+        mocks.mw.addonManager.getConfig.return_value = {
+            "notetype_conversion_backup": "full"
+        }
+
+        extra_notetype_versions._create_conversion_backup(
+            {"AnKingOverhaul": [2, 3]}, [1]
+        )
+
+        mocks.snapshot.assert_called_once_with(mids=[2, 3, 1], note_mids=[2, 3])
+        mocks.backup.assert_called_once()
+
+    def test_skips_full_backup_when_disabled_in_config(self, mocks):
+        mocks.mw.addonManager.getConfig.return_value = {
+            "notetype_conversion_backup": "snapshot"
+        }
+
+        extra_notetype_versions._create_conversion_backup({"AnKingOverhaul": [2]}, [1])
+
+        mocks.snapshot.assert_called_once()
+        mocks.backup.assert_not_called()
+
+    def test_skips_full_backup_when_there_is_a_recent_backup(self, mocks):
+        mocks.mw.addonManager.getConfig.return_value = {}
+        mocks.recent_backup.return_value = True
+
+        extra_notetype_versions._create_conversion_backup({"AnKingOverhaul": [2]}, [1])
+
+        mocks.snapshot.assert_called_once()
+        mocks.backup.assert_not_called()
+
+
+class TestSyncResourcesIntoMediaFolder:
+    @pytest.fixture
+    def folders(self, tmp_path):
+        resources, media = tmp_path / "resources", tmp_path / "media"
+        resources.mkdir()
+        media.mkdir()
+        with patch.object(media_resources, "RESOURCES_PATH", resources), patch.object(
+            media_resources, "OPTIMIZED_RESOURCES_PATH", resources / "optimized"
+        ), patch.object(media_resources, "MANIFEST_PATH", tmp_path / "manifest.json"):
+            yield resources, media
+
+    def _sync(self, media) -> list:
+        with patch.object(
+            media_resources.shutil,
+            "copyfile",
+            side_effect=media_resources.shutil.copyfile,
+        ) as copyfile_mock:
+            media_resources._sync_resources_into_media_folder(str(media))
+        return [Path(call[0][0]).name for call in copyfile_mock.call_args_list]
+
+    def test_copies_new_and_changed_resources_only(self, folders):
+        resources, media = folders
+        (resources / "_a.png").write_bytes(b"a")
+        (resources / "_b.png").write_bytes(b"b")
+
+        assert sorted(self._sync(media)) == ["_a.png", "_b.png"]
+        assert self._sync(media) == []
+
+        (resources / "_a.png").write_bytes(b"A")
+        assert self._sync(media) == ["_a.png"]
+        assert (media / "_a.png").read_bytes() == b"A"
+
+    def test_replacing_existing_files_changes_media_folder_mtime(self, folders):
+        resources, media = folders
+        (resources / "_a.png").write_bytes(b"A")
+        (media / "_a.png").write_bytes(b"a")
+        os.utime(media, (0, 0))
+
+        assert self._sync(media) == ["_a.png"]
+        assert (media / "_a.png").read_bytes() == b"A"
+        # Anki only registers changed media files when the folder mtime changed
+        assert media.stat().st_mtime > 0
+
+    def test_does_not_change_media_folder_mtime_when_nothing_was_replaced(
+        self, folders
+    ):
+        resources, media = folders
+        (resources / "_a.png").write_bytes(b"a")
+        (media / "_a.png").write_bytes(b"a")
+        os.utime(media, (0, 0))
+
+        assert self._sync(media) == []
+        assert media.stat().st_mtime == 0
+
+    def test_recopies_resources_removed_from_media_folder(self, folders):
+        resources, media = folders
+        (resources / "_a.png").write_bytes(b"a")
+        self._sync(media)
+
+        (media / "_a.png").unlink()
+        assert self._sync(media) == ["_a.png"]
+
+    def test_does_not_copy_identical_resources_copied_before(self, folders):
+        resources, media = folders
+        (resources / "_a.png").write_bytes(b"a")
+        (media / "_a.png").write_bytes(b"a")
+
+        assert self._sync(media) == []
+
+    def test_copies_optimized_variants_instead_of_originals(self, folders):
+        resources, media = folders
+        (resources / "optimized").mkdir()
+        (resources / "_a.png").write_bytes(b"large")
+        (resources / "_b.png").write_bytes(b"b")
+        (resources / "optimized" / "_a.png").write_bytes(b"small")
+
+        assert sorted(self._sync(media)) == ["_a.png", "_b.png"]
+        assert (media / "_a.png").read_bytes() == b"small"
+        assert not (media / "optimized").exists()
+
+    def test_removes_superseded_unreferenced_versioned_resources(self, folders):
+        resources, media = folders
+        (resources / "__ankingio-0.6.2.js").write_bytes(b"js")
+        (resources / "__ankingio-0.6.2.css").write_bytes(b"css")
+        for name in [
+            "__ankingio-0.5.0.js",
+            "__ankingio-0.6.0.css",
+            "__ankingio-0.10.0.js",
+            "__ankingio-custom.js",
+            "ankingio-0.5.0.js",
+        ]:
+            (media / name).write_bytes(b"old")
+
+        mw_mock = MagicMock()
+        mw_mock.col.models.all_names_and_ids.return_value = [
+            SimpleNamespace(id=1, name="IO-one by one")
+        ]
+        mw_mock.col.models.get.return_value = {
+            "css": "",
+            "tmpls": [{"qfmt": '<script src="__ankingio-0.6.0.css">', "afmt": ""}],
+        }
+        with patch.object(media_resources, "mw", mw_mock):
+            self._sync(media)
+
+        mw_mock.col.media.trash_files.assert_called_once_with(["__ankingio-0.5.0.js"])
+
+
+class TestOnProfileDidOpen:
+    def test_startup_work_is_run_when_main_window_is_idle(self):
+        mw_mock = MagicMock()
+        with patch.object(anking_notetypes, "mw", mw_mock), patch.object(
+            anking_notetypes, "run_startup_work"
+        ) as run_startup_work_mock, patch.object(timing, "apply_config"):
+            anking_notetypes.on_profile_did_open()
+
+        mw_mock.progress.single_shot.assert_called_once_with(0, run_startup_work_mock)
+        run_startup_work_mock.assert_not_called()
+
+    def test_startup_timer_is_deleted_after_it_fired_on_old_anki_versions(self):
+        mw_mock = MagicMock()
+        del mw_mock.progress.single_shot
+        with patch.object(anking_notetypes, "mw", mw_mock), patch.object(
+            anking_notetypes, "run_startup_work"
+        ) as run_startup_work_mock, patch.object(timing, "apply_config"):
+            anking_notetypes.on_profile_did_open()
+            run_startup_work_mock.assert_not_called()
+
+            ms, on_timer, repeat = mw_mock.progress.timer.call_args[0]
+            assert (ms, repeat) == (0, False)
+            on_timer()
+
+        run_startup_work_mock.assert_called_once()
+        mw_mock.progress.timer.return_value.deleteLater.assert_called_once()
+
+
+class TestMaybeShowNotetypesUpdateNotice:
+    @pytest.fixture
+    def mw_mock(self):
+        mw_mock = MagicMock()
+        mw_mock.addonManager.getConfig.return_value = {
+            "latest_notified_note_type_version": "1"
+        }
+
+        def run_in_background(task, on_done):
+            future = MagicMock()
+            future.result.return_value = task()
+            on_done(future)
+
+        mw_mock.taskman.run_in_background.side_effect = run_in_background
+        with patch.object(anking_notetypes, "mw", mw_mock), patch.object(
+            notetype_setting_definitions, "anking_notetype_models", return_value=[{}]
+        ), patch.object(
+            anking_notetypes, "show_notetypes_update_notice"
+        ) as show_notice_mock:
+            mw_mock.show_notice = show_notice_mock
+            yield mw_mock
+
+    def test_shows_notice_if_updates_are_available(self, mw_mock):
+        with patch.object(utils, "note_type_version", return_value="2"), patch.object(
+            utils, "models_with_available_updates", return_value=[{}]
+        ):
+            anking_notetypes.maybe_show_notetypes_update_notice()
+
+        mw_mock.show_notice.assert_called_once_with("2")
+
+    def test_does_not_check_for_updates_if_user_was_notified(self, mw_mock):
+        with patch.object(utils, "note_type_version", return_value="1"), patch.object(
+            utils, "models_with_available_updates"
+        ) as models_with_updates_mock:
+            anking_notetypes.maybe_show_notetypes_update_notice()
+
+        models_with_updates_mock.assert_not_called()
+        mw_mock.show_notice.assert_not_called()
+
+    def test_does_not_show_notice_without_updates(self, mw_mock):
+        with patch.object(utils, "note_type_version", return_value="2"), patch.object(
+            utils, "models_with_available_updates", return_value=[]
+        ):
+            anking_notetypes.maybe_show_notetypes_update_notice()
+
+        mw_mock.show_notice.assert_not_called()
+
+
+class TestImportTime:
+    # Importing the add-on should only register hooks. The modules below are imported when
+    # they are first needed. The time of the import is measured by benchmarks/bench_import.py.
+    LAZILY_IMPORTED_MODULES = [
+        "src.anking_notetypes.gui.config_window",
+        "src.anking_notetypes.gui.extra_notetype_versions",
+        "src.anking_notetypes.notetype_setting_definitions",
+        "src.anking_notetypes.ankiaddonconfig",
+    ]
+
+    def test_import_doesnt_load_heavy_modules(self):
+        result = bench_import.import_addon()
+
+        for module in self.LAZILY_IMPORTED_MODULES:
+            assert module not in result["modules"]
+
+    def test_import_time_is_checked_against_budget(self):
+        def run(secs):
+            with patch.object(
+                bench_import,
+                "import_addon",
+                return_value={"secs": secs, "modules": ["src.anking_notetypes"]},
+            ):
+                return bench_import.run(3)
+
+        assert not run(0.02).details["over_budget"]
+        results = run(0.2)
+        assert results.details["over_budget"]
+        assert results.details["budget_ms"] == bench_import.IMPORT_BUDGET_MS
+
+
+class TestSetAutoopenTags:
+    def test_replaces_autoopen_tags_in_chunks_with_one_undo_step(self):
+        mw_mock = MagicMock()
+        mw_mock.col.tags.all.return_value = [
+            "AutoOpen::extra",
+            "autoopen::lecture",
+            "autoopen_not",
+            "other",
+        ]
+        mw_mock.col.add_custom_undo_entry.return_value = 7
+        progress = []
+
+        with patch.object(anking_notetypes, "mw", mw_mock), patch.object(
+            anking_notetypes, "AUTOOPEN_TAGS_CHUNK_SIZE", 2
+        ):
+            anking_notetypes.set_autoopen_tags(
+                [1, 2, 3], ["autoopen::hint_1"], progress.append
+            )
+
+        # the prefix is matched case-sensitively, like note_autoopen_fields does
+        assert [c[0] for c in mw_mock.col.tags.bulk_remove.call_args_list] == [
+            ([1, 2], "autoopen::lecture"),
+            ([3], "autoopen::lecture"),
+        ]
+        assert [c[0] for c in mw_mock.col.tags.bulk_add.call_args_list] == [
+            ([1, 2], "autoopen::hint_1"),
+            ([3], "autoopen::hint_1"),
+        ]
+        assert mw_mock.col.merge_undo_entries.call_args_list == [call(7), call(7)]
+        assert progress == [2, 3]
+
+
+class TestHintFieldsForNids:
+    @pytest.fixture
+    def mw_mock(self):
+        mw_mock = MagicMock()
+        mw_mock.col.db.first.return_value = (1, 100, 3)
+        mw_mock.col.db.execute.return_value = [
+            (1, "Text"),
+            (1, "Missed Questions"),
+            (1, "Pixorize"),
+            (2, "Front"),
+            (2, "Missed Questions"),
+            (3, "Textbook"),
+        ]
+        mw_mock.col.db.list.side_effect = lambda query: (
+            [1, 2] if "1,2" in query else [2]
+        )
+        with patch.object(utils, "mw", mw_mock), patch.object(
+            utils, "_field_names_by_mid_cache", None
+        ), patch.object(utils, "NIDS_QUERY_CHUNK_SIZE", 2):
+            yield mw_mock
+
+    def test_looks_up_note_types_in_chunks(self, mw_mock):
+        assert anking_notetypes.hint_fields_for_nids([1, 2, 3]) == [
+            "Missed Questions",
+            "Pixorize",
+        ]
+        assert mw_mock.col.db.list.call_count == 2
+
+    def test_caches_field_names_until_note_types_change(self, mw_mock):
+        anking_notetypes.hint_fields_for_nids([1])
+        anking_notetypes.hint_fields_for_nids([1])
+        assert mw_mock.col.db.execute.call_count == 1
+
+        mw_mock.col.db.first.return_value = (1, 101, 3)
+        anking_notetypes.hint_fields_for_nids([1])
+        assert mw_mock.col.db.execute.call_count == 2
+
+
+class TestEditorFieldIndices:
+    @pytest.fixture(autouse=True)
+    def field_index_maps(self):
+        with patch.object(editor, "_field_index_maps", {}) as field_index_maps:
+            yield field_index_maps
+
+    def _editor(self, items) -> MagicMock:
+        editor_mock = MagicMock()
+        editor_mock.note.note_type.return_value = {
+            "id": 1,
+            "mod": 100,
+            "flds": [{"name": name} for name, _ in items],
+        }
+        editor_mock.note.fields = [value for _, value in items]
+        editor_mock.mungeHTML.side_effect = lambda text: text
+        return editor_mock
+
+    def test_fills_empty_matching_fields_in_one_eval(self):
+        editor_mock = self._editor(
+            [("Text", ""), ("Code 1", ""), ("Code 2", "filled"), ("Code 3", "")]
+        )
+
+        assert editor.activate_matching_fields(editor_mock, [3, 1, 2, 4]) == [
+            True,
+            True,
+            True,
+            False,
+        ]
+        editor_mock.web.eval.assert_called_once()
+        js = editor_mock.web.eval.call_args[0][0]
+        assert "EditorIO.setFieldHTML(1, `active`)" in js
+        assert "EditorIO.setFieldHTML(3, `active`)" in js
+        assert "EditorIO.setFieldHTML(2," not in js
+
+    def test_doesnt_eval_without_empty_matching_fields(self):
+        editor_mock = self._editor([("Text", ""), ("Code 1", "filled")])
+
+        assert editor.activate_matching_fields(editor_mock, [1]) == [True]
+        editor_mock.web.eval.assert_not_called()
+
+    def test_max_code_field_stops_at_skipped_index(self):
+        editor_mock = self._editor(
+            [("Code 0", ""), ("Code 1", ""), ("Code 2", ""), ("Code 4", "")]
+        )
+        assert editor.get_max_code_field(editor_mock) == 2
+
+    def test_inserts_into_zero_indexed_field(self):
+        editor_mock = self._editor([("Text", ""), ("Code 0", "")])
+        editor.insert_into_zero_indexed(editor_mock, "text")
+        editor_mock.web.eval.assert_called_once_with(
+            "EditorIO.insertIntoZeroIndexed(`text`, 1); "
+        )
+
+    def test_field_index_map_is_cached_per_note_type_version(self, field_index_maps):
+        editor_mock = self._editor([("Code 1", "")])
+        editor.field_index_map(editor_mock)
+        editor.field_index_map(editor_mock)
+        assert list(field_index_maps.keys()) == [(1, 100)]
+
+        editor_mock.note.note_type.return_value["mod"] = 101
+        editor.field_index_map(editor_mock)
+        assert list(field_index_maps.keys()) == [(1, 100), (1, 101)]
+
+    def test_base_top_is_highest_index_in_any_field(self):
+        editor_mock = self._editor(
+            [("Text", "{{c2::a}} {{c10::b}}"), ("Extra", "{{c3::c}}"), ("Code 1", "")]
+        )
+        assert editor.get_base_top(editor_mock, "{{c", "::") == 10
+        assert editor.get_base_top(editor_mock, "[[oc", "::") == 0
+
+
+class TestRemoveOcclusionCode:
+    def test_returns_fields_without_occlusion_containers_unchanged(self):
+        txt = "<table><tr><td>a</td></tr></table>" * 100
+        assert editor.remove_occlusion_code(txt, None) is txt
+
+    def test_replaces_each_container_with_its_image(self):
+        txt = (
+            'a<div class="anking-occlusion-container"><svg></svg><img src="1.png"></div><br><br>'
+            'b<div class="anking-occlusion-container"><img src="2\\\\.png"></div>'
+        )
+        assert (
+            editor.remove_occlusion_code(txt, None)
+            == 'a<img src="1.png">b<img src="2\\\\.png">'
+        )
+
+
+class TestToggleImageBlur:
+    def test_adds_and_removes_blur_class_of_matching_images_only(self):
+        html = (
+            '<div  data-x="a>b"><IMG src="a.png" alt=\'x > y\'/></div>'
+            '<img src="b.png"><img class="big" src="/a.png">'
+        )
+        blurred = image_blur.toggle_image_blur(html, "a.png")
+        assert blurred == (
+            '<div  data-x="a>b"><IMG class="blur" src="a.png" alt=\'x > y\'/></div>'
+            '<img src="b.png"><img class="big blur" src="/a.png">'
+        )
+        assert image_blur.toggle_image_blur(blurred, "a.png") == html
+
+    def test_keeps_quotes_and_entities(self):
+        html = "<img class='blur big' src=\"a&amp;b.png\">"
+        assert (
+            image_blur.toggle_image_blur(html, "a&b.png")
+            == "<img class='big' src=\"a&amp;b.png\">"
+        )
+
+    def test_returns_fields_without_the_image_unchanged(self):
+        html = "<table><tr><td>a</td></tr></table>" * 100 + '<img src="b.png">'
+        assert image_blur.toggle_image_blur(html, "a.png") is html
+
+
+class TestSetImagesBlur:
+    def test_blurs_and_unblurs_images_matching_filename_pattern(self):
+        html = '<img src="a.PNG"><img src="dir/b.jpg"><img class="blur" src="c.png">'
+        src_matches = image_blur.filename_matcher("*.png")
+
+        assert image_blur.set_images_blur(html, True, src_matches) == (
+            '<img class="blur" src="a.PNG"><img src="dir/b.jpg"><img class="blur" src="c.png">'
+        )
+        assert image_blur.set_images_blur(html, False, src_matches) == (
+            '<img src="a.PNG"><img src="dir/b.jpg"><img src="c.png">'
+        )
+
+    def test_empty_pattern_matches_all_images(self):
+        html = '<img src="a.png"><img src="dir/b.jpg">'
+        assert image_blur.set_images_blur(
+            html, True, image_blur.filename_matcher(" ")
+        ) == ('<img class="blur" src="a.png"><img class="blur" src="dir/b.jpg">')
+
+    def test_updates_changed_notes_in_chunks_with_one_undo_step(self):
+        notes = {
+            1: SimpleNamespace(fields=['<img src="a.png">', ""]),
+            2: SimpleNamespace(fields=['<img class="blur" src="a.png">']),
+            3: SimpleNamespace(fields=['<img src="b.png">']),
+        }
+        mw_mock = MagicMock()
+        mw_mock.col.db.list.side_effect = lambda query: [
+            nid for nid in notes if str(nid) in query
+        ]
+        mw_mock.col.get_note.side_effect = notes.get
+        mw_mock.col.add_custom_undo_entry.return_value = 7
+
+        with patch.object(anking_notetypes, "mw", mw_mock), patch.object(
+            anking_notetypes, "BLUR_IMAGES_CHUNK_SIZE", 2
+        ):
+            changed_count = anking_notetypes.set_images_blur_of_notes(
+                [1, 2, 3], True, lambda src: src == "a.png"
+            )
+
+        assert changed_count == 1
+        mw_mock.col.update_notes.assert_called_once_with([notes[1]])
+        assert notes[1].fields == ['<img class="blur" src="a.png">', ""]
+        assert mw_mock.col.merge_undo_entries.call_args_list == [call(7), call(7)]
+
+
+class TestLazyEditorCode:
+    @pytest.fixture(autouse=True)
+    def mw_mock(self):
+        with patch.object(editor, "mw", MagicMock()) as mw_mock, patch.object(
+            editor, "_editors_with_io_code", editor.weakref.WeakSet()
+        ):
+            mw_mock.addonManager.addonFromModule.return_value = "anking_notetypes"
+            yield mw_mock
+
+    def _note(self, model_name: str) -> MagicMock:
+        note = MagicMock()
+        note.note_type.return_value = {"name": model_name}
+        return note
+
+    def test_loads_code_only_for_io_note_types(self):
+        editor_mock = MagicMock(spec=editor.Editor)
+
+        assert (
+            editor.clear_occlusion_mode("load();", self._note("Basic"), editor_mock)
+            == "load();"
+        )
+
+        js = editor.clear_occlusion_mode(
+            "load();", self._note("IO-one by one"), editor_mock
+        )
+        assert "/_addons/anking_notetypes/web/editor.js" in js
+        assert js.endswith(".then(() => { load(); }); ")
+
+        # the code stays loaded for other note types
+        assert "editor.js" not in editor.clear_occlusion_mode(
+            "load();", self._note("Basic"), editor_mock
+        )
+
+    def test_later_loads_wait_for_the_code_to_be_loaded(self):
+        editor_mock = MagicMock(spec=editor.Editor)
+
+        first_js = editor.clear_occlusion_mode(
+            "first();", self._note("IO-one by one"), editor_mock
+        )
+        second_js = editor.clear_occlusion_mode(
+            "second();", self._note("IO-one by one"), editor_mock
+        )
+
+        assert first_js.startswith("(globalThis.ankingIOLoaded = new Promise(")
+        # the second note can be loaded before the code of the first one finished loading
+        assert second_js == (
+            "(globalThis.ankingIOLoaded ?? Promise.resolve())"
+            ".then(() => globalThis.EditorIO && EditorIO.clearOcclusionMode())"
+            ".then(() => { second(); }); "
+        )
+
+    def test_mounted_fields_are_styled_when_io_note_is_loaded_after_other_note(self):
+        editor_mock = MagicMock(spec=editor.Editor)
+        editor.clear_occlusion_mode("", self._note("Basic"), editor_mock)
+
+        js = editor.clear_occlusion_mode(
+            "load();", self._note("IO-one by one"), editor_mock
+        )
+        # the fields mounted for the Basic note are reused for the IO note
+        assert "EditorIO.addOcclusionStyleToMountedFields()" in js
+        assert js.index("addOcclusionStyleToMountedFields") < js.index("load();")
+
+    def test_code_is_loaded_again_after_editor_content_is_replaced(self):
+        editor_mock = MagicMock(spec=editor.Editor)
+        editor.clear_occlusion_mode("", self._note("IO-one by one"), editor_mock)
+
+        editor.include_closet_code(MagicMock(), editor_mock)
+        js = editor.clear_occlusion_mode("", self._note("IO-one by one"), editor_mock)
+        assert "/_addons/anking_notetypes/web/editor.js" in js
+
+
+class TestConfigManager:
+    @pytest.fixture
+    def conf(self):
+        mw_mock = MagicMock()
+        mw_mock.addonManager.getConfig.return_value = {
+            "a": {"b": 1, "c": {"d": 2}},
+            "lst": [{"x": 1}, 2],
+            "empty": {},
+            "dotted": {"x.y": 1},
+        }
+        with patch.object(manager, "mw", mw_mock):
+            yield manager.ConfigManager()
+
+    def test_get_and_contains(self, conf):
+        assert conf.get("a.b") == 1
+        assert conf.get("a.c") == {"d": 2}
+        assert conf.get("a") == {"b": 1, "c": {"d": 2}}
+        assert conf.get("lst.0.x") == 1
+        assert conf.get("lst.1") == 2
+        assert conf.get("empty") == {}
+        assert conf.get("a.missing", "default") == "default"
+        assert conf.get("missing.b") is None
+        assert "a.c.d" in conf
+        assert "a.c" in conf
+        assert "a.x" not in conf
+        assert list(conf) == ["a", "lst", "empty", "dotted"]
+
+    def test_set(self, conf):
+        conf.set("a.c", {"e": 3})
+        conf.set("new.key", 4)
+        conf.set("empty.f", 5)
+        conf.set("lst.0.x", 6)
+        conf["a.b"] = [1, 2]
+
+        assert json.loads(conf.to_json()) == {
+            "a": {"b": [1, 2], "c": {"e": 3}},
+            "lst": [{"x": 6}, 2],
+            "empty": {"f": 5},
+            "dotted": {"x.y": 1},
+            "new": {"key": 4},
+        }
+
+    def test_pop(self, conf):
+        assert conf.pop("a.c.d") == 2
+        assert conf.get("a.c") == {}
+        assert conf.pop("a") == {"b": 1, "c": {}}
+        assert conf.pop("lst.0") == {"x": 1}
+        assert conf.pop("missing.key") is None
+        with pytest.raises(KeyError):
+            conf.pop("empty.missing")
+        del conf["dotted"]
+
+        assert json.loads(conf.to_json()) == {"lst": [2], "empty": {}}
+
+    def test_dicts_and_lists_are_shared_with_the_config(self, conf):
+        a = conf.get("a")
+        a["c"]["d"] = 3
+        assert conf.get("a.c.d") == 3
+
+        lst = conf.get("lst")
+        lst.append(3)
+        assert conf.get("lst.2") == 3
+
+        value = {"e": {"f": 1}}
+        conf.set("new", value)
+        value["e"]["f"] = 2
+        assert conf.get("new.e.f") == 2
+        assert conf.get("new") is value
+
+        conf.set("new.e.g", 3)
+        assert value == {"e": {"f": 2, "g": 3}}
+
+    def test_list_index_keys(self, conf):
+        conf.set("lst.0.x", 3)
+        conf.set("lst.1", 4)
+        assert conf.get("lst") == [{"x": 3}, 4]
+        assert "lst.0.x" in conf
+
+        assert conf.pop("lst.0") == {"x": 3}
+        assert conf.get("lst.0") == 4
+        assert conf.diff() == {"lst": ([{"x": 1}, 2], [4])}
+
+        with pytest.raises(IndexError):
+            conf.get("lst.5")
+
+    def test_set_below_a_scalar_value_raises(self, conf):
+        with pytest.raises(AttributeError):
+            conf.set("a.b.x", 1)
+        assert conf.get("a.b") == 1
+
+    def test_change_hooks_are_called_for_changed_values_only(self, conf):
+        hook = MagicMock()
+        conf.on_change(hook)
+
+        conf.set("a.b", 1)
+        conf.set("a.b", 2)
+        conf.set("a.x", 3, on_change_trigger=False)
+
+        hook.assert_called_once_with("a.b", 2)
+
+    def test_change_hooks_for_keys_and_prefixes(self, conf):
+        key_hook = MagicMock()
+        prefix_hook = MagicMock()
+        conf.on_change(key_hook, key="a.b")
+        conf.on_change(prefix_hook, prefix="a.c")
+
+        conf.set("a.b", 2)
+        conf.set("a.c.d", 3)
+        conf.set("a.c", 4)
+        conf.set("a.cd", 5)
+
+        key_hook.assert_called_once_with("a.b", 2)
+        assert prefix_hook.call_args_list == [call("a.c.d", 3), call("a.c", 4)]
+
+        conf.remove_on_change_hook(key_hook)
+        conf.remove_on_change_hook(prefix_hook)
+        conf.set("a.b", 6)
+        conf.set("a.c", 7)
+        assert key_hook.call_count == 1
+        assert prefix_hook.call_count == 2
+
+    def test_change_hooks_are_called_in_registration_order(self, conf):
+        calls = []
+
+        def hook(name):
+            return lambda key, value: calls.append(name)
+
+        conf.on_change(hook("prefix"), prefix="a")
+        conf.on_change(hook("all"))
+        conf.on_change(hook("key"), key="a.b")
+        conf.on_change(hook("all 2"))
+
+        conf.set("a.b", 2)
+        assert calls == ["prefix", "all", "key", "all 2"]
+
+        calls.clear()
+        conf.set("x", 1)
+        assert calls == ["all", "all 2"]
+
+    def test_changed_keys_and_diff(self, conf):
+        assert conf.changed_keys() == []
+
+        conf.set("a.b", 5)
+        conf.set("a.b", 1)
+        conf.set("a.c.d", 3)
+        conf.set("lst.0.x", 4)
+        conf.set("new", {"k": 1})
+        conf.pop("dotted")
+
+        assert conf.diff() == {
+            "a.c.d": (2, 3),
+            "lst": ([{"x": 1}, 2], [{"x": 4}, 2]),
+            "new.k": (None, 1),
+            "dotted": ({"x.y": 1}, None),
+        }
+
+        conf.set_baseline()
+        assert conf.changed_keys() == []
+
+    def test_restore_baseline(self, conf):
+        original = conf.to_json()
+        conf.set("a", 5)
+        conf.set("lst.0.x", 4)
+        conf.pop("empty")
+        conf.set("empty", {"f": 1})
+        conf.set("new", {"k": 1})
+
+        conf.restore_baseline()
+
+        assert conf.to_json() == original
+        assert conf.changed_keys() == []
+
+    def test_changes_are_recorded_without_copying_values(self, conf):
+        a = conf.get("a")
+        conf.get("lst")
+        assert conf._baseline == {}
+
+        conf.set("a", 5)
+        assert conf.diff()["a"][0] is a
+
+    def test_save_sets_baseline(self, conf):
+        conf.set("a.b", 5)
+        conf.save()
+        assert conf.changed_keys() == []
+
+    def test_closing_the_window_discards_unsaved_changes(self, conf):
+        original = conf.to_json()
+        conf.set("a.b", 5)
+        conf.set("lst.0.x", 4)
+        conf.pop("empty")
+        conf.set("new.key", 1)
+        close_hook = MagicMock()
+        dialog = SimpleNamespace(
+            conf=conf, _on_close_hook=[close_hook], geom_key="geom"
+        )
+        evt = MagicMock()
+
+        with patch.object(window, "saveGeom"):
+            window.ConfigWindow.closeEvent(dialog, evt)
+
+        close_hook.assert_called_once()
+        evt.accept.assert_called_once()
+        assert conf.to_json() == original
+        assert conf.changed_keys() == []
+
+
+class TestCollapsibleSection:
+    def test_builder_runs_once_when_the_section_is_expanded(self):
+        widget_update = MagicMock()
+        widget_update_of_builder = MagicMock()
+        layout = SimpleNamespace(
+            config_window=MagicMock(),
+            widget_updates=[widget_update],
+            addWidget=MagicMock(),
+        )
+
+        def builder(section_layout):
+            assert section_layout is content_layout
+            layout.widget_updates.append(widget_update_of_builder)
+
+        builder_mock = MagicMock(side_effect=builder)
+        add_section = window.ConfigLayout.collapsible_section
+        with patch.object(window, "ConfigLayout") as layout_class, patch.object(
+            window, "CollapsibleSection"
+        ) as section_class:
+            content_layout = layout_class.return_value
+            assert add_section(layout, "Title", builder_mock) is content_layout
+
+            builder_mock.assert_not_called()
+            layout.addWidget.assert_called_once_with(section_class.return_value)
+
+            on_first_expand = section_class.call_args.kwargs["on_first_expand"]
+            section = SimpleNamespace(
+                _on_first_expand=on_first_expand,
+                setContentLayout=MagicMock(),
+                content_area=MagicMock(),
+                toggle_button=MagicMock(),
+                toggle_animation=MagicMock(),
+            )
+            on_pressed = collapsible_section.CollapsibleSection.on_pressed
+            on_pressed(section)
+            on_pressed(section)
+
+        builder_mock.assert_called_once()
+        widget_update_of_builder.assert_called_once()
+        widget_update.assert_not_called()
+        assert section.toggle_animation.start.call_count == 2
+
+    def test_section_without_builder(self):
+        layout = SimpleNamespace(
+            config_window=MagicMock(), widget_updates=[], addWidget=MagicMock()
+        )
+        add_section = window.ConfigLayout.collapsible_section
+        with patch.object(window, "ConfigLayout"), patch.object(
+            window, "CollapsibleSection"
+        ) as section_class:
+            add_section(layout, "Title")
+
+        assert section_class.call_args.kwargs["on_first_expand"] is None
+
+
+class TestApplySettingChanges:
+    def test_changed_settings_and_versions_out_of_sync_are_updated(self):
+        window = config_window.NotetypesConfigWindow()
+        window.conf = MagicMock()
+        window.conf.changed_keys.return_value = ["AnKing.setting_a", "general.other"]
+        config = {"AnKing.setting_a": 2, "AnKing.setting_b": 1, "Basic.setting_b": 1}
+        window.conf.get.side_effect = config.get
+        main_model = {"id": 1, "name": "AnKing", "setting_a": 1, "setting_b": 1}
+        copy_model = {"id": 2, "name": "AnKing-1dgs0", "setting_a": 1, "setting_b": 3}
+        basic_model = {"id": 3, "name": "Basic", "setting_b": 1}
+        models = {"AnKing": [main_model, copy_model], "Basic": [basic_model]}
+        # the versions the config was read from
+        window._read_in_model_ids = {1, 3}
+
+        def nts_mock(name):
+            nts = MagicMock()
+            nts.name.return_value = name
+            nts.key.side_effect = lambda nt_base_name: f"{nt_base_name}.{name}"
+            nts.setting_value.side_effect = lambda model: model[name]
+            return nts
+
+        nts_a = nts_mock("setting_a")
+        nts_b = nts_mock("setting_b")
+
+        with patch.object(
+            config_window, "anking_notetype_names", return_value=list(models)
+        ), patch.object(
+            config_window, "note_type_versions", side_effect=models.get
+        ), patch.object(
+            config_window,
+            "ntss_for_model",
+            side_effect=lambda model: [nts_a, nts_b]
+            if "setting_a" in model
+            else [nts_b],
+        ) as ntss_for_model_mock, patch.object(
+            window, "_safe_update_model_settings"
+        ) as update_mock, patch.object(
+            config_window, "mw"
+        ) as mw_mock:
+            window._apply_setting_changes_for_all_notetypes()
+
+        # only the copy is compared with the config, the note types without changes
+        # aren't parsed
+        assert ntss_for_model_mock.call_args_list == [
+            call(main_model),
+            call(copy_model),
+        ]
+        assert nts_b.setting_value.call_args_list == [call(copy_model)]
+
+        # the copy has a value that differs from the main note type
+        assert update_mock.call_args_list == [
+            call(model=main_model, nt_base_name="AnKing", ntss=[nts_a]),
+            call(model=copy_model, nt_base_name="AnKing", ntss=[nts_a, nts_b]),
+        ]
+        assert mw_mock.col.models.update_dict.call_args_list == [
+            call(main_model),
+            call(copy_model),
+        ]
+        window.conf.set_baseline.assert_called_once()
+
+
+@pytest.fixture
+def timing_paths(tmp_path):
+    with patch.object(timing, "USER_FILES_PATH", tmp_path), patch.object(
+        timing, "TIMING_LOG_PATH", tmp_path / "timing.log"
+    ), patch.object(timing, "LAST_SESSION_PATH", tmp_path / "last_session.json"):
+        timing._stats.clear()
+        yield tmp_path
+        timing._stats.clear()
+
+
+class TestTiming:
+    def test_nothing_is_recorded_when_disabled(self, timing_paths):
+        with patch.object(timing, "_enabled", False):
+            timing.timed("parsing")(lambda: None)()
+
+        assert timing.session_stats()["categories"] == {}
+
+    def test_nested_calls_of_a_category_are_counted_once(self, timing_paths):
+        @timing.timed("parsing")
+        def parse(depth):
+            if depth:
+                parse(depth - 1)
+
+        with patch.object(timing, "_enabled", True):
+            parse(2)
+            parse(0)
+            with timing.timer("db_writes"):
+                pass
+
+        categories = timing.session_stats()["categories"]
+        assert categories["parsing"]["count"] == 2
+        assert categories["db_writes"]["count"] == 1
+
+    def test_config_enables_timing(self):
+        with patch.object(timing, "_enabled", False), patch.object(
+            timing, "_ENABLED_BY_ENV", False
+        ):
+            timing.apply_config({timing.TIMING_CONFIG_KEY: True})
+            assert timing.is_enabled()
+            timing.apply_config({})
+            assert not timing.is_enabled()
+
+    def test_end_session_writes_stats(self, timing_paths):
+        timing.end_session()
+        assert timing.last_session_stats() is None
+
+        timing.record("parsing", 0.5)
+        timing.end_session()
+
+        assert timing.session_stats()["categories"] == {}
+        last_stats = timing.last_session_stats()
+        assert last_stats["categories"]["parsing"] == {
+            "count": 1,
+            "total_secs": 0.5,
+            "max_secs": 0.5,
+        }
+        log = (timing_paths / "timing.log").read_text()
+        assert "parsing" in log and "500.0 ms total" in log
+
+
+class TestCompareBenchmarkResults:
+    def test_regressions_above_threshold_are_reported(self):
+        def results(secs_by_group):
+            return {
+                "benchmark": "notetypes",
+                "results": {
+                    group: {"median_secs": secs}
+                    for group, secs in secs_by_group.items()
+                },
+            }
+
+        rows, regressions = compare.compare_results(
+            results({"slower": 0.01, "faster": 0.01, "noise": 0.00001, "old": 0.01}),
+            results({"slower": 0.02, "faster": 0.005, "noise": 0.00005, "new": 0.01}),
+            threshold=1.2,
+        )
+
+        assert regressions == ["slower"]
+        assert [row[3] for row in rows] == ["0.50x", "-", "-", "-", "2.00x"]
+
+
+class TestBenchRegex:
+    def test_log_log_slope(self):
+        linear = [(chars, chars * 1e-6) for chars in [100, 200, 400, 800]]
+        quadratic = [(chars, chars**2 * 1e-9) for chars in [100, 200, 400, 800]]
+
+        assert bench_regex.log_log_slope(linear) == pytest.approx(1)
+        assert bench_regex.log_log_slope(quadratic) == pytest.approx(2)
+        assert bench_regex.log_log_slope(linear[:1]) is None
+        assert bench_regex.log_log_slope([]) is None
+
+    def test_growth_exponent(self):
+        def time_runs(search, runs):  # pylint: disable=unused-argument
+            chars = len(search.args[0])
+            return [chars**3 * 1e-8, chars**3 * 1e-7]
+
+        with patch.object(
+            bench_regex, "time_runs", side_effect=time_runs
+        ), patch.object(bench_regex, "PADDING_FACTORS", [1, 2, 4, 8, 16, 32, 64]):
+            exponent = bench_regex.growth_exponent(re.compile("a"), "b" * 10, 3)
+            searched_chars = [
+                len(call_args.args[0].args[0])
+                for call_args in bench_regex.time_runs.call_args_list
+            ]
+
+        assert exponent == pytest.approx(3)
+        # the search in 10 chars is too fast to be used and the padding
+        # isn't grown further after the search in 640 chars took 2.6 seconds
+        assert searched_chars == [10, 20, 40, 80, 160, 320, 640]
+
+    def test_backtracking_suspects(self):
+        def timing(setting, source, secs):
+            return bench_regex.SearchTiming(
+                setting=setting,
+                source=source,
+                file="back",
+                chars=1000,
+                secs=secs,
+                matched=True,
+            )
+
+        timings = [
+            timing("a", "AnKing", 0.0001),
+            timing("b", "AnKing", 0.0001),
+            timing("slow", "AnKing", 0.002),
+            # too fast to be reported
+            timing("a", "Basic", 0.000001),
+            timing("b", "Basic", 0.000001),
+            timing("slow", "Basic", 0.00001),
+        ]
+
+        suspects = bench_regex.backtracking_suspects(timings)
+
+        assert [(entry["setting"], entry["source"]) for entry in suspects] == [
+            ("slow", "AnKing")
+        ]
+        assert suspects[0]["times_median"] == pytest.approx(20)
+
+
+class TestBenchMemory:
+    def test_subsystem_of(self):
+        addon_path = bench_memory.ADDON_PATH
+
+        def traceback(*filenames):
+            # tracemalloc passes the frames from the most recent to the oldest
+            return tracemalloc.Traceback(
+                tuple((filename, 1) for filename in reversed(filenames))
+            )
+
+        assert (
+            bench_memory.subsystem_of(
+                traceback(
+                    str(addon_path / "gui" / "config_window.py"),
+                    str(addon_path / "notetype_setting.py"),
+                    "/usr/lib/python3/re/__init__.py",
+                )
+            )
+            == "setting parsing and rewriting"
+        )
+        assert (
+            bench_memory.subsystem_of(traceback(str(addon_path / "editor.py")))
+            == bench_memory.OTHER_ADDON_SUBSYSTEM
+        )
+        assert (
+            bench_memory.subsystem_of(traceback("/usr/lib/python3/json/decoder.py"))
+            == bench_memory.OUTSIDE_ADDON_SUBSYSTEM
+        )
+
+    def test_retained_growth_per_cycle(self):
+        def cycles(*traced_bytes):
+            return [{"traced_bytes_after_close": size} for size in traced_bytes]
+
+        assert bench_memory.retained_growth_per_cycle(cycles(1000)) == 0
+        assert bench_memory.retained_growth_per_cycle(
+            cycles(1000, 1010, 990)
+        ) == pytest.approx(-5)
+        assert bench_memory.retained_growth_per_cycle(
+            cycles(1000, 2000, 3000)
+        ) == pytest.approx(1000)
+
+
+class TestSyntheticCollection:
+    def test_creates_notetype_versions_and_notes(self, tmp_path):
+        spec = synthetic_collection.SyntheticCollectionSpec(
+            notes=30, notetype_names=["AnKing MCAT"], copies_per_notetype=2
+        )
+        col = synthetic_collection.create_synthetic_collection(
+            tmp_path / "collection.anki2", spec
+        )
+        try:
+            names = [x.name for x in col.models.all_names_and_ids()]
+            assert "AnKingMCAT" in names
+            assert "AnKingMCAT (Synthetic Deck 1 / SyntheticUser)" in names
+            assert len([name for name in names if name.startswith("AnKingMCAT-")]) == 2
+            assert col.note_count() == 30
+            assert col.card_count() == 30
+        finally:
+            col.close()